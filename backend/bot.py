@@ -5,6 +5,9 @@ import re # <-- 新增：用于正则表达式匹配分享链接
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters
 from backend.services.service_115 import drive_115
+from backend.core.db import get_config
+from backend.core.magnet_index import magnet_index
+from backend.core.offline_tracker import offline_tracker
 
 logger = logging.getLogger("TGBot")
 
@@ -27,6 +30,7 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/start - 检查状态\n"
         "/quota - 查看 115 空间配额\n"
         "/magnet <link> - 手动添加离线任务\n"
+        "/magnet -f <link> - 忽略去重记录，强制重新提交\n"
         "/move <file_ids> <target_cid> - 移动文件（转存）",
         parse_mode='HTML'
     )
@@ -49,23 +53,53 @@ async def check_quota(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"📊 <b>空间使用:</b>\n{used:.2f} TB / {total:.2f} TB", parse_mode='HTML')
 
 
-async def add_offline_tasks(update: Update, urls: list):
-    """处理离线下载任务"""
-    await update.message.reply_text(f"📥 正在添加 {len(urls)} 个离线任务到 115...")
-    
-    task_func = partial(drive_115.add_offline_task, urls=urls)
-    try:
-        res = await asyncio.to_thread(task_func)
-    except Exception as e:
-        logger.error(f"Error during add_offline_task: {e}")
-        await update.message.reply_text("❌ 离线服务调用失败，请检查日志。", parse_mode='HTML')
+async def add_offline_tasks(update: Update, urls: list, force: bool = False):
+    """处理离线下载任务；force 为 True 时跳过去重检查"""
+    # 已提交过的链接直接从去重索引回复，不再占用 115 离线配额
+    new_urls, dup_lines = [], []
+    for url in urls:
+        dup = None if force else magnet_index.find_duplicate(url)
+        if dup:
+            dup_lines.append(f"• {dup['state']} → {dup['target_folder']}")
+        else:
+            new_urls.append(url)
+    if dup_lines:
+        await update.message.reply_text(
+            f"♻️ {len(dup_lines)} 个链接已提交过，跳过：\n" + "\n".join(dup_lines)
+            + "\n如需重新提交，请使用 /magnet -f <链接>"
+        )
+    if not new_urls:
         return
-    
-    
-    if res and res.get("status") == "success":
-        await update.message.reply_text("✅ 离线任务添加成功！")
-    else:
-        await update.message.reply_text(f"❌ 离线任务添加失败: {res.get('msg', '未知API错误')}", parse_mode='HTML')
+    urls = new_urls
+
+    # 与 /api/offline/create 走同一创建流程：记录远程任务 id / 状态 / 目标目录，并由轮询器跟踪到完成后转存
+    target = get_config("offline.targetFolder", "/") or "/"
+    await update.message.reply_text(f"📥 正在添加 {len(urls)} 个离线任务到 115 → {target}...")
+
+    added, failed = 0, []
+    for url in urls:
+        try:
+            await asyncio.to_thread(offline_tracker.submit, url, target, True)
+            added += 1
+        except Exception as e:
+            logger.error(f"Error during add_offline_task: {e}")
+            failed.append(str(e))
+
+    if added:
+        await update.message.reply_text(f"✅ {added} 个离线任务添加成功，完成后转存到 {target}")
+    if failed:
+        await update.message.reply_text(f"❌ {len(failed)} 个离线任务添加失败: {failed[0]}")
+
+
+async def magnet_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/magnet [-f] <链接...>：手动添加离线任务，-f 强制重新提交已记录的链接"""
+    args = list(context.args or [])
+    force = bool(args) and args[0].lower() in ("-f", "--force", "force")
+    urls = [a.strip() for a in (args[1:] if force else args) if a.strip()]
+    if not urls:
+        await update.message.reply_text("⚠️ 用法: /magnet [-f] <链接>", parse_mode='HTML')
+        return
+    await add_offline_tasks(update, urls, force=force)
 
 
 async def transfer_shared_files(update: Update, share_link: str, pickcode: str = None):
@@ -173,7 +207,7 @@ async def run_bot(token: str):
         app.add_handler(CommandHandler("start", start))
         app.add_handler(CommandHandler("help", help_cmd))
         app.add_handler(CommandHandler("quota", check_quota))
-        app.add_handler(CommandHandler("magnet", add_offline_tasks))
+        app.add_handler(CommandHandler("magnet", magnet_cmd))
         app.add_handler(CommandHandler("move", move_file)) # <-- 注册文件移动/转存命令
         
         # 注册 MessageHandler (处理所有非命令文本)
@@ -0,0 +1,94 @@
+# backend/core/async_iter.py
+"""
+把阻塞的（可能是惰性的）迭代器放到独立线程中拉取，协程侧用 async for 消费
+- 迭代器的每次 next()（例如 fs_walk 翻页请求）都在工作线程中执行，事件循环不会被阻塞
+- 线程与协程之间是有界队列：消费者跟不上时工作线程停下等待，内存占用有上限
+- 条目按小批传递，减少跨线程调度次数；源迭代器抛出的异常在 async for 处原样抛出
+- 消费者提前退出或被取消时，工作线程在当前条目之后停止并关闭源迭代器
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import AsyncIterator, Callable, Iterable, TypeVar, Union
+
+T = TypeVar("T")
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_CHUNK_SIZE = 100
+
+_DONE = object()
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+async def iterate_in_thread(source: Union[Callable[[], Iterable[T]], Iterable[T]],
+                            queue_size: int = DEFAULT_QUEUE_SIZE,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            name: str = "async-iter") -> AsyncIterator[T]:
+    """
+    source 为可迭代对象或返回可迭代对象的无参函数（函数本身也在工作线程中调用，
+    例如 partial(client.fs_walk, cid=cid)）。队列中最多 queue_size 批、每批最多 chunk_size 条
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(obj) -> bool:
+        fut = asyncio.run_coroutine_threadsafe(queue.put(obj), loop)
+        while True:
+            try:
+                fut.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    fut.cancel()
+                    return False
+            except (concurrent.futures.CancelledError, RuntimeError):
+                # 事件循环已关闭
+                return False
+
+    def produce():
+        iterator = None
+        try:
+            iterator = iter(source() if callable(source) else source)
+            chunk = []
+            for item in iterator:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    if stop.is_set() or not put(chunk):
+                        return
+                    chunk = []
+            if chunk and not put(chunk):
+                return
+            put(_DONE)
+        except BaseException as e:
+            if not stop.is_set():
+                put(_Failure(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if stop.is_set() and close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, _Failure):
+                raise chunk.error
+            for item in chunk:
+                yield item
+    finally:
+        stop.set()
+        # 清空队列，让阻塞在 put 上的工作线程尽快发现 stop
+        while not queue.empty():
+            queue.get_nowait()
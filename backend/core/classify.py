@@ -4,7 +4,7 @@
 提供 match_category(title, metadata) -> (primary, secondary)
 """
 
-from core.zid_loader import ZID_CACHE
+from core.zid_loader import load_zid
 from core.logger import push_log
 
 def match_category(name: str, metadata: dict = None):
@@ -15,7 +15,7 @@ def match_category(name: str, metadata: dict = None):
     metadata = metadata or {}
     name_low = name.lower()
     # 简单匹配：遍历 zid map 的 values，尝试关键字出现
-    for primary, subs in (ZID_CACHE or {}).items():
+    for primary, subs in (load_zid() or {}).items():
         if not isinstance(subs, dict):
             continue
         for sub_key, pattern in subs.items():
@@ -1,6 +1,7 @@
 # backend/core/db.py
 import sqlite3
 import os
+import threading
 from pathlib import Path
 from core.encrypt import encrypt_str, decrypt_str
 
@@ -36,6 +37,32 @@ CREATE TABLE IF NOT EXISTS secrets (
 );
 """
 
+# WAL 模式的独立存储（任务队列、索引、缓存等），每个线程复用一个连接
+_store_local = threading.local()
+
+def open_store(path: Path, schema_sql: str = None) -> sqlite3.Connection:
+    """
+    打开（或复用当前线程已打开的）WAL 模式 SQLite 连接。
+    schema_sql 应只包含 IF NOT EXISTS 语句，同一连接上每份 schema 只执行一次，
+    因此多个模块可以在同一个库文件里各自建表。
+    """
+    conns = getattr(_store_local, "conns", None)
+    if conns is None:
+        conns = _store_local.conns = {}
+        _store_local.schemas = set()
+    key = str(path)
+    conn = conns.get(key)
+    if conn is None:
+        conn = sqlite3.connect(key, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[key] = conn
+    if schema_sql and (key, schema_sql) not in _store_local.schemas:
+        conn.executescript(schema_sql)
+        conn.commit()
+        _store_local.schemas.add((key, schema_sql))
+    return conn
+
 def get_data_conn():
     return _ensure_db(DATA_DB, DATA_SCHEMA)
 
@@ -0,0 +1,151 @@
+# backend/core/dir_index.py
+"""
+115 目录树本地索引（cid → 子条目）
+- P115Wrapper.list_page 每取到一页就写入 dir_index.db，TTL 内同一目录的同一页直接从本地返回
+- 本进程发起的移动 / 新建目录 / 重命名会立即失效相关目录（write-through 失效）
+- 目录在 offset=0 的那一页重新拉取时整体换代，避免新旧两代的分页混在一起
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from core.db import open_store, get_config
+
+BASE = Path(__file__).resolve().parent.parent
+DIR_INDEX_DB = BASE / "dir_index.db"
+
+DIR_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+  cid TEXT PRIMARY KEY,
+  total INTEGER,
+  fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+  parent_cid TEXT NOT NULL,
+  id TEXT NOT NULL,
+  pos INTEGER NOT NULL,
+  name TEXT,
+  is_dir INTEGER NOT NULL DEFAULT 0,
+  size INTEGER,
+  sha1 TEXT,
+  pickcode TEXT,
+  mtime TEXT,
+  raw TEXT NOT NULL,
+  PRIMARY KEY (parent_cid, id)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_parent_pos ON entries(parent_cid, pos);
+CREATE INDEX IF NOT EXISTS idx_entries_id ON entries(id);
+"""
+
+DEFAULT_TTL = 300
+
+def normalize_entry(x: Any) -> Dict[str, Any]:
+    """把 115 列表条目（fid/cid, n, s, sha, pc, te）转换为统一字段"""
+    if not isinstance(x, dict):
+        return {"id": str(x), "name": str(x), "is_dir": False, "size": None, "sha1": None, "pickcode": None, "mtime": None}
+    is_dir = "fid" not in x
+    return {
+        "id": str(x.get("cid") if is_dir else x.get("fid")),
+        "name": x.get("n") or x.get("name"),
+        "is_dir": is_dir,
+        "size": x.get("s") or x.get("size"),
+        "sha1": x.get("sha") or x.get("sha1"),
+        "pickcode": x.get("pc") or x.get("pickcode"),
+        "mtime": str(x.get("te") or x.get("t") or "") or None,
+    }
+
+def _entry_row(parent_cid: str, pos: int, x: Any) -> Tuple:
+    """索引行，原始条目以 JSON 保留"""
+    e = normalize_entry(x)
+    return (
+        parent_cid, e["id"], pos, e["name"], int(e["is_dir"]), e["size"], e["sha1"], e["pickcode"], e["mtime"],
+        json.dumps(x, ensure_ascii=False),
+    )
+
+class DirIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "pages_stored": 0, "invalidations": 0}
+
+    def _conn(self):
+        return open_store(DIR_INDEX_DB, DIR_INDEX_SCHEMA)
+
+    def _ttl(self) -> float:
+        try:
+            return float(get_config("dir_index.ttl", DEFAULT_TTL))
+        except Exception:
+            return DEFAULT_TTL
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats_counters[key] += 1
+
+    def get_page(self, cid: str, offset: int, limit: int) -> Optional[Tuple[List[Any], Optional[int]]]:
+        """TTL 内且该页已完整缓存时返回 (条目列表, 总数)，否则返回 None"""
+        conn = self._conn()
+        row = conn.execute("SELECT total, fetched_at FROM dirs WHERE cid=?", (cid,)).fetchone()
+        if not row or time.time() - row[1] > self._ttl():
+            self._count("misses")
+            return None
+        total = row[0]
+        want = limit if total is None else max(0, min(limit, total - offset))
+        rows = conn.execute(
+            "SELECT raw FROM entries WHERE parent_cid=? AND pos>=? AND pos<? ORDER BY pos",
+            (cid, offset, offset + limit),
+        ).fetchall()
+        if len(rows) < want:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return [json.loads(r[0]) for r in rows], total
+
+    def store_page(self, cid: str, offset: int, limit: int, items: List[Any], total: Optional[int]):
+        if total is None and len(items) < limit:
+            # 不返回总数的接口：短页即最后一页
+            total = offset + len(items)
+        conn = self._conn()
+        with conn:
+            if offset == 0:
+                conn.execute("DELETE FROM entries WHERE parent_cid=?", (cid,))
+                conn.execute("REPLACE INTO dirs(cid,total,fetched_at) VALUES(?,?,?)", (cid, total, time.time()))
+            elif total is not None:
+                conn.execute("UPDATE dirs SET total=? WHERE cid=?", (total, cid))
+            conn.executemany(
+                "REPLACE INTO entries(parent_cid,id,pos,name,is_dir,size,sha1,pickcode,mtime,raw) VALUES(?,?,?,?,?,?,?,?,?,?)",
+                [_entry_row(cid, offset + i, x) for i, x in enumerate(items)],
+            )
+        self._count("pages_stored")
+
+    def invalidate(self, *cids: str):
+        """丢弃指定目录的缓存；不传参数时清空整个索引"""
+        conn = self._conn()
+        with conn:
+            if not cids:
+                conn.execute("DELETE FROM dirs")
+                conn.execute("DELETE FROM entries")
+            for cid in cids:
+                conn.execute("DELETE FROM dirs WHERE cid=?", (str(cid),))
+                conn.execute("DELETE FROM entries WHERE parent_cid=?", (str(cid),))
+        self._count("invalidations")
+
+    def invalidate_entries(self, ids: Iterable[str]):
+        """条目被移动 / 重命名：失效其所在目录，条目本身是目录时一并失效"""
+        ids = [str(i) for i in ids]
+        if not ids:
+            return
+        conn = self._conn()
+        marks = ",".join("?" * len(ids))
+        parents = [r[0] for r in conn.execute(f"SELECT DISTINCT parent_cid FROM entries WHERE id IN ({marks})", ids)]
+        self.invalidate(*parents, *ids)
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        dirs = conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+        entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        with self._lock:
+            return {**self.stats_counters, "dirs": dirs, "entries": entries, "ttl": self._ttl()}
+
+dir_index = DirIndex()
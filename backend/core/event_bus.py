@@ -0,0 +1,88 @@
+# backend/core/event_bus.py
+"""
+进程内事件总线：任务状态 / 进度 / 日志事件的内存扇出
+- publish(kind, data) 线程安全，可在任务线程中直接调用
+- 每个事件带单调递增的 seq，保留最近 _MAX_EVENTS 条，用于断点续传（resume cursor）
+- subscribe() 返回订阅对象，SSE 路由在事件循环中从其 queue 读取
+同一个事件只生成一次，再分发给所有订阅者，订阅者数量不影响任务线程的开销。
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+_MAX_EVENTS = 2000
+_QUEUE_SIZE = 1000
+
+_lock = threading.Lock()
+_events = deque(maxlen=_MAX_EVENTS)
+_seq = 0
+_subscribers = set()
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, task_id: Optional[str] = None):
+        self.loop = loop
+        self.task_id = task_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        # 队列满时丢弃的事件数；客户端可用 cursor 重连补齐
+        self.dropped = 0
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        return self.task_id is None or event["data"].get("task_id") == self.task_id
+
+    def _put(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        if not self.matches(event):
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+            return True
+        except RuntimeError:
+            # 事件循环已关闭
+            return False
+
+def publish(kind: str, data: Dict[str, Any]) -> int:
+    """发布事件，返回事件 seq"""
+    global _seq
+    with _lock:
+        _seq += 1
+        event = {"seq": _seq, "type": kind, "ts": time.time(), "data": data}
+        _events.append(event)
+        subs = list(_subscribers)
+    for sub in subs:
+        if not sub.offer(event):
+            unsubscribe(sub)
+    return event["seq"]
+
+def subscribe(task_id: Optional[str] = None) -> Subscription:
+    """在事件循环线程中调用"""
+    sub = Subscription(asyncio.get_running_loop(), task_id)
+    with _lock:
+        _subscribers.add(sub)
+    return sub
+
+def unsubscribe(sub: Subscription):
+    with _lock:
+        _subscribers.discard(sub)
+
+def replay(cursor: int = 0, task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """返回 seq > cursor 的缓存事件（超出保留窗口的事件无法补齐）"""
+    with _lock:
+        events = list(_events)
+    return [e for e in events if e["seq"] > cursor and (task_id is None or e["data"].get("task_id") == task_id)]
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "last_seq": _seq,
+            "buffered": len(_events),
+            "oldest_seq": _events[0]["seq"] if _events else None,
+            "subscribers": len(_subscribers),
+        }
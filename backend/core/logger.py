@@ -7,6 +7,8 @@ import time
 from collections import deque
 from typing import List, Dict
 
+from core import event_bus
+
 _MAX_LOGS = 1000
 _lock = threading.Lock()
 _logs = deque(maxlen=_MAX_LOGS)
@@ -25,6 +27,8 @@ def push_log(level: str, text: str, task_id: str = None) -> None:
         if task_id:
             entry["task_id"] = task_id
         _logs.append(entry)
+    # 推送给 SSE 订阅者（/api/task/events）
+    event_bus.publish("log", entry)
 
 def list_logs(limit: int = 200) -> List[Dict]:
     with _lock:
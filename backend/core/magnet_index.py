@@ -0,0 +1,143 @@
+# backend/core/magnet_index.py
+"""
+离线链接去重索引
+- 按规范化后的链接键（BTIH / ed2k hash / URL）记录远程任务 id、状态和目标目录
+- 重复提交时直接从内存索引返回已有记录，不再创建新的 115 离线任务
+- 数据持久化在 offline.db，进程启动后首次查询时整体载入内存
+"""
+
+import base64
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+from core.db import open_store
+from core.offline_tracker import MAX_AGE, OFFLINE_DB, OfflineState
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS offline_index (
+  link_key TEXT PRIMARY KEY,
+  url TEXT NOT NULL,
+  remote_id TEXT,
+  local_task_id TEXT,
+  state TEXT NOT NULL,
+  target_folder TEXT,
+  created_at REAL NOT NULL,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_offline_index_remote ON offline_index(remote_id);
+"""
+
+# 已提交但无法跟踪远程 id（如 bot 批量提交）的记录状态
+STATE_SUBMITTED = "submitted"
+# 这些状态视为"已有任务"，重复提交会被拦截；失败/超时的链接允许重新提交
+_ACTIVE_STATES = (OfflineState.PENDING, OfflineState.DONE, STATE_SUBMITTED)
+# 没有轮询器跟踪的记录（无远程 id）不会进入终态，只在该时长内拦截重复提交（与轮询器放弃跟踪的时长一致）
+UNTRACKED_TTL = MAX_AGE
+
+_FIELDS = ("link_key", "url", "remote_id", "local_task_id", "state", "target_folder", "created_at", "updated_at")
+
+def normalize_link(url: str) -> str:
+    """
+    返回链接的规范化键：
+    - magnet: btih:<40位小写hex>（32 位 base32 形式会转换为 hex）
+    - ed2k:   ed2k:<小写hash>
+    - 其它:   url:<去掉 fragment、scheme/host 小写后的 URL>
+    """
+    u = url.strip()
+    low = u.lower()
+    if low.startswith("magnet:?"):
+        for xt in parse_qs(u[len("magnet:?"):]).get("xt", []):
+            xt_low = xt.lower()
+            if xt_low.startswith("urn:btih:"):
+                h = xt[len("urn:btih:"):]
+                if len(h) == 32:
+                    try:
+                        h = base64.b32decode(h.upper()).hex()
+                    except Exception:
+                        pass
+                return f"btih:{h.lower()}"
+            if xt_low.startswith("urn:btmh:"):
+                return f"btmh:{xt_low[len('urn:btmh:'):]}"
+    if low.startswith("ed2k://"):
+        parts = u.split("|")
+        # ed2k://|file|<name>|<size>|<hash>|/
+        if len(parts) >= 5 and parts[1].lower() == "file":
+            return f"ed2k:{parts[4].lower()}"
+    try:
+        s = urlsplit(u)
+        return "url:" + urlunsplit((s.scheme.lower(), s.netloc.lower(), s.path, s.query, ""))
+    except ValueError:
+        return "url:" + u
+
+class MagnetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._by_remote: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        return open_store(OFFLINE_DB, INDEX_SCHEMA)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    rows = self._conn().execute(f"SELECT {','.join(_FIELDS)} FROM offline_index").fetchall()
+                    self._by_remote = {r[2]: r[0] for r in rows if r[2]}
+                    self._entries = {r[0]: dict(zip(_FIELDS, r)) for r in rows}
+        return self._entries
+
+    def find_duplicate(self, url: str) -> Optional[Dict[str, Any]]:
+        """链接已提交过（且未失败）时返回已有记录，否则返回 None"""
+        entry = self._load().get(normalize_link(url))
+        if entry and entry["state"] in _ACTIVE_STATES and not self._untracked_expired(entry):
+            self.hits += 1
+            return dict(entry)
+        self.misses += 1
+        return None
+
+    @staticmethod
+    def _untracked_expired(entry: Dict[str, Any]) -> bool:
+        untracked = entry["state"] == STATE_SUBMITTED or (entry["state"] == OfflineState.PENDING and not entry["remote_id"])
+        return untracked and time.time() - entry["updated_at"] > UNTRACKED_TTL
+
+    def record(self, url: str, remote_id: Optional[str] = None, local_task_id: Optional[str] = None,
+               target_folder: str = "/", state: str = OfflineState.PENDING):
+        now = time.time()
+        entry = {
+            "link_key": normalize_link(url), "url": url, "remote_id": remote_id, "local_task_id": local_task_id,
+            "state": state, "target_folder": target_folder, "created_at": now, "updated_at": now,
+        }
+        conn = self._conn()
+        conn.execute(
+            f"REPLACE INTO offline_index({','.join(_FIELDS)}) VALUES({','.join('?' * len(_FIELDS))})",
+            tuple(entry[f] for f in _FIELDS),
+        )
+        conn.commit()
+        entries = self._load()
+        with self._lock:
+            entries[entry["link_key"]] = entry
+            if remote_id:
+                self._by_remote[remote_id] = entry["link_key"]
+
+    def update_state(self, remote_id: str, state: str):
+        """由离线任务轮询器在任务完成 / 失败时回写状态"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("UPDATE offline_index SET state=?, updated_at=? WHERE remote_id=?", (state, now, remote_id))
+        conn.commit()
+        entries = self._load()
+        with self._lock:
+            entry = entries.get(self._by_remote.get(remote_id, ""))
+            if entry:
+                entry["state"] = state
+                entry["updated_at"] = now
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._load()), "hits": self.hits, "misses": self.misses}
+
+magnet_index = MagnetIndex()
@@ -0,0 +1,277 @@
+# backend/core/offline_tracker.py
+"""
+115 离线任务集中轮询器
+- 所有未完成的远程离线任务登记在 offline.db 的一张表中（重启后继续跟踪）
+- 单个后台线程按到期时间批量查询状态：优先用离线任务列表接口一次拿回一整页，
+  不支持时才逐个查询
+- 自适应退避：刚提交的任务每 5 秒查一次，运行越久查询间隔越长（最长 5 分钟）
+- submit() 是创建离线任务的统一入口（API 与 Telegram Bot 共用）：创建、登记去重索引并开始跟踪
+- 任务完成后执行 转存 → 重命名/移动 → 生成 STRM 的后续流程（提交到通用任务队列）
+"""
+
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.db import open_store
+from core.logger import push_log
+from core.p115_client import P115Wrapper
+from core.p115_pool import p115_pool
+
+BASE = Path(__file__).resolve().parent.parent
+OFFLINE_DB = BASE / "offline.db"
+
+OFFLINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS offline_tasks (
+  remote_id TEXT PRIMARY KEY,
+  local_task_id TEXT NOT NULL,
+  target_folder TEXT NOT NULL,
+  notify_tg INTEGER NOT NULL DEFAULT 1,
+  state TEXT NOT NULL,
+  checks INTEGER NOT NULL DEFAULT 0,
+  created_at REAL NOT NULL,
+  next_check_at REAL NOT NULL,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_offline_state_next ON offline_tasks(state, next_check_at);
+"""
+
+class OfflineState:
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+
+_DONE_VALUES = ("finished", "completed", "success", "done", "2")
+_FAILED_VALUES = ("failed", "error", "-1")
+
+MIN_INTERVAL = 5        # 新任务的查询间隔（秒）
+MAX_INTERVAL = 300      # 长时间运行任务的最大查询间隔（秒）
+MAX_AGE = 5 * 3600      # 超过该时长仍未完成则放弃跟踪
+MAX_LIST_PAGES = 5      # 单轮最多翻页数
+
+def remote_task_id(d: Dict[str, Any]) -> Optional[str]:
+    """从 create_offline_task 的返回中提取远程任务 id"""
+    for k in ("task_id", "id", "tid", "info_hash"):
+        if d.get(k):
+            return str(d[k])
+    return None
+
+def _status_of(d: Dict[str, Any]) -> str:
+    st = d.get("status")
+    if st is None:
+        st = d.get("state")
+    return str(st).lower()
+
+def _next_interval(age: float) -> float:
+    # 运行时间的 10%，夹在 [MIN_INTERVAL, MAX_INTERVAL] 之间
+    return max(MIN_INTERVAL, min(MAX_INTERVAL, age * 0.1))
+
+class OfflineTracker:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"ticks": 0, "list_calls": 0, "single_calls": 0, "completed": 0, "failed": 0}
+
+    def _conn(self):
+        return open_store(OFFLINE_DB, OFFLINE_SCHEMA)
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="offline-tracker", daemon=True)
+            self._thread.start()
+
+    def submit(self, url: str, target_folder: str = "/", notify_tg: bool = True) -> Dict[str, Any]:
+        """
+        创建 115 离线任务，记录到去重索引并登记轮询，返回 {local_task_id, remote_id, remote}。
+        115 调用失败时抛出 P115Error / P115RateLimited
+        """
+        from core.magnet_index import magnet_index, STATE_SUBMITTED
+        # 复用进程级常驻客户端，调用经 P115Wrapper 内的 AIMD 限流器排队
+        with p115_pool.lease() as p115:
+            res = p115.create_offline_task(url)
+        # 本地任务 id（时间戳 + 随机）
+        local_task_id = f"offline-{int(time.time())}-{uuid.uuid4().hex[:6]}"
+        remote_id = remote_task_id(res) if isinstance(res, dict) else None
+        # 没有远程 id 时轮询器无法把记录推进到终态，按未跟踪记录登记（超时后允许重新提交）
+        magnet_index.record(url, remote_id, local_task_id, target_folder,
+                            state=OfflineState.PENDING if remote_id else STATE_SUBMITTED)
+        if remote_id:
+            self.track(remote_id, local_task_id, target_folder, notify_tg)
+            push_log("INFO", "已提交离线任务，等待集中轮询", task_id=local_task_id)
+        else:
+            push_log("WARN", "离线任务返回中没有任务 id，无法跟踪完成状态", task_id=local_task_id)
+        return {"local_task_id": local_task_id, "remote_id": remote_id, "remote": res}
+
+    def track(self, remote_id: str, local_task_id: str, target_folder: str = "/", notify_tg: bool = True):
+        """登记一个远程离线任务，由后台线程统一轮询"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "REPLACE INTO offline_tasks(remote_id,local_task_id,target_folder,notify_tg,state,checks,created_at,next_check_at,updated_at) "
+            "VALUES(?,?,?,?,?,0,?,?,?)",
+            (remote_id, local_task_id, target_folder, int(bool(notify_tg)), OfflineState.PENDING, now, now + MIN_INTERVAL, now),
+        )
+        conn.commit()
+        self.start()
+        self._wake.set()
+
+    def list_tracked(self, state: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        conn = self._conn()
+        sql = "SELECT remote_id,local_task_id,target_folder,state,checks,created_at,next_check_at,updated_at FROM offline_tasks"
+        params: tuple = ()
+        if state:
+            sql += " WHERE state=?"
+            params = (state,)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        rows = conn.execute(sql, params + (limit,)).fetchall()
+        keys = ("remote_id", "local_task_id", "target_folder", "state", "checks", "created_at", "next_check_at", "updated_at")
+        return [dict(zip(keys, r)) for r in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        pending = conn.execute("SELECT COUNT(*) FROM offline_tasks WHERE state=?", (OfflineState.PENDING,)).fetchone()[0]
+        return {**self.stats, "pending": pending, "running": bool(self._thread and self._thread.is_alive())}
+
+    # ------------------------------------------------------------------
+    # 后台轮询
+    # ------------------------------------------------------------------
+
+    def _loop(self):
+        while True:
+            try:
+                delay = self._tick()
+            except Exception as e:
+                push_log("ERROR", f"离线任务轮询异常: {e}")
+                delay = MIN_INTERVAL
+            self._wake.wait(timeout=delay)
+            self._wake.clear()
+
+    def _tick(self) -> float:
+        """处理所有到期任务，返回距离下一次到期的秒数"""
+        now = time.time()
+        conn = self._conn()
+        due = conn.execute(
+            "SELECT remote_id,local_task_id,target_folder,notify_tg,checks,created_at FROM offline_tasks "
+            "WHERE state=? AND next_check_at<=? ORDER BY next_check_at",
+            (OfflineState.PENDING, now),
+        ).fetchall()
+        if due:
+            self.stats["ticks"] += 1
+            p115 = p115_pool.get()
+            statuses = self._fetch_statuses(p115, [r[0] for r in due])
+            for remote_id, local_task_id, target, notify_tg, checks, created_at in due:
+                self._handle(p115, remote_id, local_task_id, target, bool(notify_tg), checks, created_at, statuses.get(remote_id))
+        nxt = conn.execute(
+            "SELECT MIN(next_check_at) FROM offline_tasks WHERE state=?", (OfflineState.PENDING,)
+        ).fetchone()[0]
+        if nxt is None:
+            return MAX_INTERVAL
+        return max(0.5, nxt - time.time())
+
+    def _fetch_statuses(self, p115: P115Wrapper, remote_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        wanted = set(remote_ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        try:
+            for page in range(1, MAX_LIST_PAGES + 1):
+                tasks = p115.list_offline_tasks(page)
+                self.stats["list_calls"] += 1
+                for t in tasks:
+                    # 同时用 task_id / info_hash 建索引，兼容不同的远程 id 形式
+                    for k in ("task_id", "id", "tid", "info_hash"):
+                        if t.get(k) and str(t[k]) in wanted:
+                            found[str(t[k])] = t
+                if not tasks or wanted.issubset(found):
+                    break
+        except Exception as e:
+            push_log("WARN", f"批量查询离线任务失败，改为逐个查询: {e}")
+        # 列表中没找到的（接口不可用或超出翻页范围）再逐个查询
+        for remote_id in remote_ids:
+            if remote_id in found:
+                continue
+            try:
+                found[remote_id] = p115.get_offline_status(remote_id)
+                self.stats["single_calls"] += 1
+            except Exception as e:
+                push_log("WARN", f"查询离线任务状态出错: {e}")
+        return found
+
+    def _handle(self, p115, remote_id, local_task_id, target, notify_tg, checks, created_at, status):
+        now = time.time()
+        conn = self._conn()
+        st = _status_of(status) if status else ""
+        if st in _DONE_VALUES:
+            self._set_state(remote_id, OfflineState.DONE)
+            self.stats["completed"] += 1
+            push_log("INFO", "离线任务已完成，开始转存", task_id=local_task_id)
+            self._dispatch_followup(p115, remote_id, local_task_id, target, notify_tg)
+        elif st in _FAILED_VALUES:
+            self._set_state(remote_id, OfflineState.FAILED)
+            self.stats["failed"] += 1
+            push_log("ERROR", f"离线任务失败: {status}", task_id=local_task_id)
+        elif now - created_at > MAX_AGE:
+            self._set_state(remote_id, OfflineState.TIMEOUT)
+            push_log("WARN", "离线任务超时未完成，停止跟踪", task_id=local_task_id)
+        else:
+            conn.execute(
+                "UPDATE offline_tasks SET checks=?, next_check_at=?, updated_at=? WHERE remote_id=?",
+                (checks + 1, now + _next_interval(now - created_at), now, remote_id),
+            )
+            conn.commit()
+
+    def _set_state(self, remote_id: str, state: str):
+        from core.magnet_index import magnet_index
+        conn = self._conn()
+        conn.execute("UPDATE offline_tasks SET state=?, updated_at=? WHERE remote_id=?", (state, time.time(), remote_id))
+        conn.commit()
+        magnet_index.update_state(remote_id, state)
+
+    def _dispatch_followup(self, p115, remote_id, local_task_id, target, notify_tg):
+        from task_queue import submit_task, TaskPriority
+        from utils.strm import generate_strm_for_files
+        from utils.rename import smart_rename_and_move
+        from core.zid_loader import load_zid
+
+        try:
+            p115.offline_transfer_to_115(remote_id, target)
+            push_log("INFO", "离线任务转存完成，触发整理流程", task_id=local_task_id)
+        except Exception as e:
+            push_log("ERROR", f"转存失败: {e}", task_id=local_task_id)
+
+        def job(update_progress):
+            try:
+                # 1) 分页遍历 target 目录（不截断大目录）；
+                #    先完整列出再移动：边翻页边把文件移出同一目录会让后续页的偏移错位而漏掉文件
+                def iter_paths():
+                    try:
+                        for item in p115.iter_files(target):
+                            yield item.get("path") if isinstance(item, dict) else item
+                    except Exception as e:
+                        push_log("WARN", f"列出目录失败: {e}", task_id=local_task_id)
+                files = list(iter_paths())
+                # 2) 智能重命名与分类（返回移动后的路径）
+                moved = smart_rename_and_move(files, target, zid_map=load_zid())
+                update_progress(80, "重命名/移动完成，生成 STRM")
+                # 3) 生成 strm
+                strms = generate_strm_for_files(moved, target_dir=None, template="{filepath}")
+                update_progress(95, "STRM 生成完成")
+                return {"moved": moved, "strms": strms}
+            except Exception as e:
+                push_log("ERROR", f"整理任务内部异常: {e}", task_id=local_task_id)
+                raise
+
+        tid = submit_task(job, priority=TaskPriority.BULK)
+        push_log("INFO", f"整理任务已提交 (task_id={tid})", task_id=local_task_id)
+        if notify_tg:
+            try:
+                from bot_integration import notify_bot
+                notify_bot(f"离线任务已转存并提交整理 (task_id={tid})")
+            except Exception:
+                pass
+
+offline_tracker = OfflineTracker()
@@ -1,6 +1,6 @@
 import asyncio
 import uuid
-from typing import Optional
+from typing import Any, Dict, Optional
 from core.db import get_config, get_secret
 from core.logger import push_log
 
@@ -40,6 +40,22 @@ async def start_organize_job() -> Optional[str]:
         return None
 
 
+async def preview_organize_job() -> Optional[Dict[str, Any]]:
+    """整理预演（dry-run）：识别源目录文件并返回剧集分组与分类计划，不移动任何文件
+    
+    Returns:
+        dict: {"groups": [{group, category, files}], "plan": {分类: 文件数}}，失败返回 None
+    """
+    try:
+        from services.service_organizer import organizer
+        from core.db import get_all_config
+        organizer.init_config(get_all_config())
+        return await organizer.run_organize(dry_run=True)
+    except Exception as e:
+        push_log("ERROR", f"整理预演失败: {e}")
+        return None
+
+
 async def _run_organize_task(job_id: str, source_cid: str, target_cid: str):
     """实际执行整理任务的后台函数"""
     try:
@@ -4,12 +4,16 @@ p115client 适配器：以健壮方式调用你仓库的 p115client。
 本模块不打印敏感数据（如 cookie），调用方负责保密。
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, NamedTuple, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import importlib
+import inspect
 import time
 
 # 日志
 from core.logger import push_log
+from core.qps_limiter import get_adaptive_limiter, AdaptiveRateLimiter
+from core.dir_index import dir_index
 
 P115 = None
 _loaded = False
@@ -32,6 +36,154 @@ _try_import()
 class P115Error(Exception):
     pass
 
+class P115RateLimited(P115Error):
+    """本地限流器排队超时（上游额度不足）"""
+    pass
+
+# 115 返回的限流提示（异常信息或响应中的 error/msg 字段）
+_THROTTLE_HINTS = ("too frequent", "too many requests", "频繁")
+# 表示限流的 HTTP 状态码 / 响应码：只比对结构化字段，不在文本中查找（文件名、id 中的数字会误判）
+_THROTTLE_STATUS = frozenset((429, 405))
+
+def _float_config(key: str, default: float) -> float:
+    try:
+        from core.db import get_config
+        return float(get_config(key, default))
+    except Exception:
+        return default
+
+_LIMITER: Optional[AdaptiveRateLimiter] = None
+
+def get_115_limiter() -> AdaptiveRateLimiter:
+    """
+    所有 115 调用共享的 AIMD 限流器：初始速率取 115_qps，
+    并在 [115_qps_min, 115_qps_max] 之间根据限流响应自动调整。
+    """
+    global _LIMITER
+    if _LIMITER is None:
+        qps = _float_config("115_qps", 3)
+        _LIMITER = get_adaptive_limiter(
+            "115", qps,
+            floor=_float_config("115_qps_min", 0.5),
+            ceiling=_float_config("115_qps_max", max(qps, 10)),
+        )
+    return _LIMITER
+
+def is_error(res: Any) -> bool:
+    """115 响应是否为失败结果（state 为 False，或 errno / code 非 0）"""
+    if not isinstance(res, dict) or res.get("state") is True:
+        return False
+    return res.get("state") is False or res.get("errno") not in (None, 0, "0") or res.get("code") not in (None, 0, "0")
+
+def _status_of(obj: Any) -> set:
+    """结构化字段中的状态码：响应的 errno / code / status_code，异常及其 response 的 status / status_code"""
+    if isinstance(obj, dict):
+        values = [obj.get(k) for k in ("errno", "code", "status_code")]
+    else:
+        response = getattr(obj, "response", None)
+        values = [getattr(o, k, None) for o in (obj, response) for k in ("status", "status_code", "code")]
+        # p115client 的异常通常把响应字典放在 args 中
+        values += [v for a in getattr(obj, "args", ()) if isinstance(a, dict) for v in _status_of(a)]
+    codes = set()
+    for v in values:
+        try:
+            codes.add(int(v))
+        except (TypeError, ValueError):
+            pass
+    return codes
+
+def is_throttle(obj: Any) -> bool:
+    """115 返回结果或异常是否表示被限流（用于 AIMD 限速器的 on_throttle 反馈）"""
+    if isinstance(obj, dict):
+        if not is_error(obj):
+            return False
+        text = f"{obj.get('error', '')} {obj.get('msg', '')} {obj.get('message', '')}"
+    else:
+        text = str(obj)
+    if _status_of(obj) & _THROTTLE_STATUS:
+        return True
+    text = text.lower()
+    return any(h in text for h in _THROTTLE_HINTS)
+
+# 各操作的候选方法名（按优先级）与可接受的位置参数个数（按优先级）。
+# 客户端初始化时按方法签名解析一次，之后每次调用直接使用解析结果。
+_OPERATIONS: Dict[str, Tuple[Tuple[str, ...], Tuple[int, ...]]] = {
+    "login": (("login_by_cookie", "login", "set_cookie"), (1, 0)),
+    # fs_files(payload) 支持 offset/limit 分页；其它列表方法第三个位置参数为 offset
+    "list_page": (("fs_files",), (1,)),
+    "list_files": (("list_files", "fs_list", "files_list", "list"), (3, 2, 1)),
+    "create_offline_task": (("create_offline_task", "offline_task_create", "add_offline_task", "task_create"), (1,)),
+    "get_offline_status": (("get_offline_task", "offline_task_status", "task_status", "get_task"), (1, 0)),
+    "list_offline_tasks": (("offline_list", "list_offline_tasks", "offline_task_list"), (1,)),
+    "offline_transfer": (("transfer_offline", "offline_transfer", "save_offline", "offline_task_transfer"), (2, 1)),
+    "upload_file": (("upload_file", "upload", "fs_upload", "files_upload"), (2, 1)),
+    "create_share": (("create_share", "share_create", "share", "fs_create_share"), (2, 1)),
+    "move": (("move", "file_move", "mv", "fs_move"), (2,)),
+    # 2 个参数为 (name, pid)，1 个参数为 {"cname", "pid"} payload（p115client fs_mkdir）
+    "mkdir": (("mkdir", "fs_mkdir", "makedir"), (2, 1)),
+    # 2 个参数为 (id, name)，1 个参数为 {"fid", "file_name"} payload（p115client fs_rename）
+    "rename": (("rename", "fs_rename", "file_rename"), (2, 1)),
+    # pickcode -> 下载直链（直链与请求时的 User-Agent 绑定）
+    "download_url": (("download_url", "get_download_url"), (1,)),
+}
+
+# 目录分页的默认页大小；下一页在消费当前页时后台预取
+LIST_PAGE_SIZE = 1000
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="p115-prefetch")
+
+class Capability(NamedTuple):
+    name: str          # p115client 上的方法名
+    arity: int         # 传入的位置参数个数
+    kwargs: bool       # 是否接受 **kwargs
+    first_param: str   # 第一个参数名（签名不可用时为空）
+
+def _signature_info(fn) -> Optional[Tuple[int, float, bool, str]]:
+    """返回 (必填位置参数数, 最多位置参数数, 是否接受 **kwargs, 第一个参数名)；无法获取签名时返回 None"""
+    try:
+        sig = inspect.signature(fn)
+    except (TypeError, ValueError):
+        return None
+    required, maximum, var_kw, first = 0, 0, False, ""
+    for prm in sig.parameters.values():
+        if prm.kind in (prm.POSITIONAL_ONLY, prm.POSITIONAL_OR_KEYWORD):
+            first = first or prm.name
+            maximum += 1
+            if prm.default is prm.empty:
+                required += 1
+        elif prm.kind is prm.VAR_POSITIONAL:
+            maximum = float("inf")
+        elif prm.kind is prm.VAR_KEYWORD:
+            var_kw = True
+    return required, maximum, var_kw, first
+
+# 按客户端类型缓存解析结果（同一类型的实例方法签名相同）
+_CAPABILITY_CACHE: Dict[type, Dict[str, Optional[Capability]]] = {}
+
+def resolve_capabilities(client: Any) -> Dict[str, Optional[Capability]]:
+    """为每个操作选出第一个存在且签名匹配的方法及调用约定，不支持的操作为 None"""
+    cache_key = client if inspect.ismodule(client) else type(client)
+    caps = _CAPABILITY_CACHE.get(cache_key)
+    if caps is not None:
+        return caps
+    caps = {}
+    for op, (names, arities) in _OPERATIONS.items():
+        caps[op] = None
+        for name in names:
+            fn = getattr(client, name, None)
+            if not callable(fn):
+                continue
+            info = _signature_info(fn)
+            if info is None:
+                caps[op] = Capability(name, arities[0], True, "")
+                break
+            required, maximum, var_kw, first = info
+            arity = next((a for a in arities if required <= a <= maximum), None)
+            if arity is not None:
+                caps[op] = Capability(name, arity, var_kw, first)
+                break
+    _CAPABILITY_CACHE[cache_key] = caps
+    return caps
+
 class P115Wrapper:
     def __init__(self, cookie: Optional[str] = None):
         """
@@ -41,7 +193,28 @@ class P115Wrapper:
             raise P115Error("p115client 模块不可用")
         self.cookie = cookie
         self.client = None
+        self.limiter = get_115_limiter()
         self._init_client()
+        self.capabilities = resolve_capabilities(self.client)
+
+    def _call(self, fn, *args, **kwargs):
+        """经 115 共享限流器调用 p115client，并按结果反馈给 AIMD"""
+        if not self.limiter.acquire():
+            raise P115RateLimited("115 请求排队超时（QPS 限制）")
+        try:
+            res = fn(*args, **kwargs)
+        except Exception as e:
+            if is_throttle(e):
+                self.limiter.on_throttle()
+                push_log("WARN", f"115 返回限流，降低请求速率至 {self.limiter.rate:.2f} QPS")
+            raise
+        if is_throttle(res):
+            self.limiter.on_throttle()
+            push_log("WARN", f"115 返回限流，降低请求速率至 {self.limiter.rate:.2f} QPS")
+        elif not is_error(res):
+            # 鉴权 / 参数等错误不是限流，也不能当作成功去提高速率
+            self.limiter.on_success()
+        return res
 
     def _init_client(self):
         # 尝试多种构造方式
@@ -62,108 +235,162 @@ class P115Wrapper:
         except Exception as e:
             raise P115Error(f"初始化 p115client 失败: {e}")
 
+    def _op(self, op: str, missing_msg: str):
+        cap = self.capabilities.get(op)
+        if cap is None:
+            raise P115Error(missing_msg)
+        return cap, getattr(self.client, cap.name)
+
+    def supports(self, op: str) -> bool:
+        return self.capabilities.get(op) is not None
+
+    def describe_capabilities(self) -> Dict[str, Any]:
+        return {op: (cap._asdict() if cap else None) for op, cap in self.capabilities.items()}
+
     def login_with_cookie(self, cookie: str) -> bool:
         # 不记录 cookie
+        cap, fn = self._op("login", "p115client 未实现 cookie 登录接口")
         try:
-            if hasattr(self.client, "login_by_cookie"):
-                return self.client.login_by_cookie(cookie)
-            if hasattr(self.client, "login"):
-                # login 可能接受 cookie 或 username/password；我们优先尝试 cookie
-                try:
-                    return self.client.login(cookie)
-                except TypeError:
-                    return self.client.login()
-            if hasattr(self.client, "set_cookie"):
-                self.client.set_cookie(cookie)
-                return True
-            raise P115Error("p115client 未实现 cookie 登录接口")
+            res = self._call(fn, *(cookie,)[:cap.arity])
         except Exception as e:
             raise P115Error(str(e))
+        return True if cap.name == "set_cookie" else res
 
     def list_files(self, path: str = "/", limit: int = 100) -> List[Dict[str, Any]]:
-        # 尝试多种常用方法名
-        for name in ("list_files", "fs_list", "files_list", "list"):
-            if hasattr(self.client, name):
-                fn = getattr(self.client, name)
-                try:
-                    return fn(path, limit) if callable(fn) else []
-                except TypeError:
-                    try:
-                        return fn(path)
-                    except Exception as e:
-                        continue
-        raise P115Error("p115client 未找到 list_files 方法")
+        """单页列表（最多 limit 条）；完整遍历目录请用 iter_files"""
+        return self.list_page(path, 0, limit)[0]
+
+    def list_page(self, path: str, offset: int = 0, limit: int = LIST_PAGE_SIZE,
+                  use_index: bool = True) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        列出目录的一页，返回 (条目列表, 目录总数或 None)。
+        use_index=True 时优先从本地目录索引返回（TTL 内），远程结果写回索引。
+        """
+        if use_index:
+            cached = dir_index.get_page(str(path), offset, limit)
+            if cached is not None:
+                return cached
+        items, total = self._list_page_remote(path, offset, limit)
+        if use_index:
+            dir_index.store_page(str(path), offset, limit, items, total)
+        return items, total
+
+    def _list_page_remote(self, path: str, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        # 客户端不支持 offset 时只能返回第一页（offset > 0 返回空列表）
+        cap = self.capabilities.get("list_page")
+        if cap is not None:
+            resp = self._call(getattr(self.client, cap.name), {"cid": path, "offset": offset, "limit": limit})
+            if isinstance(resp, dict):
+                total = resp.get("count")
+                return list(resp.get("data") or []), int(total) if total is not None else None
+            return list(resp or []), None
+        cap, fn = self._op("list_files", "p115client 未找到 list_files 方法")
+        if cap.arity < 3 and offset > 0:
+            return [], None
+        resp = self._call(fn, *(path, limit, offset)[:cap.arity])
+        return list(resp or []), None
+
+    def iter_files(self, path: str, page_size: int = LIST_PAGE_SIZE, prefetch: bool = True,
+                   use_index: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        逐页遍历整个目录直到取完，内存中最多同时持有两页。
+        prefetch=True 时在调用方处理当前页的同时后台请求下一页（仍经过共享限流器）。
+        """
+        offset = 0
+        pending = None
+        items, total = self.list_page(path, offset, page_size, use_index)
+        try:
+            while True:
+                offset += len(items)
+                more = len(items) >= page_size and (total is None or offset < total)
+                if more and prefetch:
+                    pending = _prefetch_pool.submit(self.list_page, path, offset, page_size, use_index)
+                yield from items
+                if not more:
+                    return
+                if pending is not None:
+                    items, total = pending.result()
+                    pending = None
+                else:
+                    items, total = self.list_page(path, offset, page_size, use_index)
+        finally:
+            # 调用方提前结束遍历时放弃预取
+            if pending is not None:
+                pending.cancel()
 
     def create_offline_task(self, url: str, params: Dict = None) -> Dict:
         """
         创建离线下载任务（适配 p115client 的不同签名）
         返回任务 info（id/status/message）
         """
-        params = params or {}
-        for name in ("create_offline_task","offline_task_create","add_offline_task","task_create"):
-            if hasattr(self.client, name):
-                fn = getattr(self.client, name)
-                try:
-                    return fn(url, **params)
-                except TypeError:
-                    try:
-                        return fn(url)
-                    except Exception:
-                        continue
-        raise P115Error("p115client 未提供离线任务创建接口")
+        cap, fn = self._op("create_offline_task", "p115client 未提供离线任务创建接口")
+        return self._call(fn, url, **((params or {}) if cap.kwargs else {}))
 
     def get_offline_status(self, task_id: str) -> Dict:
-        for name in ("get_offline_task","offline_task_status","task_status","get_task"):
-            if hasattr(self.client, name):
-                fn = getattr(self.client, name)
-                try:
-                    return fn(task_id)
-                except TypeError:
-                    try:
-                        return fn()
-                    except Exception:
-                        continue
-        raise P115Error("p115client 未提供离线任务状态查询接口")
+        cap, fn = self._op("get_offline_status", "p115client 未提供离线任务状态查询接口")
+        return self._call(fn, *(task_id,)[:cap.arity])
+
+    def list_offline_tasks(self, page: int = 1) -> List[Dict[str, Any]]:
+        """
+        批量列出离线任务（一页），用于集中轮询。
+        p115client 通常返回 {"tasks": [...], "page_count": N}，这里统一返回任务列表。
+        """
+        cap, fn = self._op("list_offline_tasks", "p115client 未提供离线任务列表接口")
+        # 第一个参数名为 page 时直接传页码，否则按 p115client 惯例传 payload 字典
+        resp = self._call(fn, page if cap.first_param == "page" else {"page": page})
+        if isinstance(resp, dict):
+            return resp.get("tasks") or resp.get("data") or []
+        return list(resp or [])
 
     def offline_transfer_to_115(self, task_id: str, target_folder: str = "/") -> Dict:
         """
         将离线任务转存到网盘。具体函数名视 p115client 版本而定。
         """
-        for name in ("transfer_offline","offline_transfer","save_offline","offline_task_transfer"):
-            if hasattr(self.client, name):
-                fn = getattr(self.client, name)
-                try:
-                    return fn(task_id, target_folder)
-                except TypeError:
-                    try:
-                        return fn(task_id)
-                    except Exception:
-                        continue
-        # 有些 p115client 将转存作为离线任务自动完成，直接返回 OK
-        return {"status": "unknown", "note": "no explicit transfer api found"}
+        cap = self.capabilities.get("offline_transfer")
+        if cap is None:
+            # 有些 p115client 将转存作为离线任务自动完成，直接返回 OK
+            return {"status": "unknown", "note": "no explicit transfer api found"}
+        return self._call(getattr(self.client, cap.name), *(task_id, target_folder)[:cap.arity])
 
     def upload_file(self, local_path: str, remote_path: str = "/") -> Dict:
-        for name in ("upload_file","upload","fs_upload","files_upload"):
-            if hasattr(self.client, name):
-                fn = getattr(self.client, name)
-                try:
-                    return fn(local_path, remote_path)
-                except TypeError:
-                    try:
-                        return fn(local_path)
-                    except Exception:
-                        continue
-        raise P115Error("p115client 未提供已知的上传方法")
+        cap, fn = self._op("upload_file", "p115client 未提供已知的上传方法")
+        return self._call(fn, *(local_path, remote_path)[:cap.arity])
 
     def create_share(self, file_id: str, passwd: Optional[str] = None) -> Dict:
-        for name in ("create_share","share_create","share","fs_create_share"):
-            if hasattr(self.client, name):
-                fn = getattr(self.client, name)
-                try:
-                    return fn(file_id, passwd) if passwd else fn(file_id)
-                except TypeError:
-                    try:
-                        return fn(file_id)
-                    except Exception:
-                        continue
-        raise P115Error("p115client 未提供已知的分享方法")
+        cap, fn = self._op("create_share", "p115client 未提供已知的分享方法")
+        args = (file_id, passwd) if passwd else (file_id,)
+        return self._call(fn, *args[:cap.arity])
+
+    def move(self, src: Any, dst: str) -> Any:
+        """src 为单个文件 id 或 id 列表（p115client fs_move 支持一次移动多个）"""
+        cap, fn = self._op("move", "p115client 未实现移动接口")
+        try:
+            return self._call(fn, src, dst)
+        finally:
+            # 失败也可能已部分生效，一律失效源目录和目标目录
+            dir_index.invalidate_entries(src if isinstance(src, (list, tuple)) else [src])
+            dir_index.invalidate(dst)
+
+    def mkdir(self, name: str, pid: str = "0") -> Any:
+        cap, fn = self._op("mkdir", "p115client 未实现新建目录接口")
+        try:
+            if cap.arity == 2:
+                return self._call(fn, name, pid)
+            return self._call(fn, {"cname": name, "pid": pid})
+        finally:
+            dir_index.invalidate(pid)
+
+    def download_url(self, pickcode: str, user_agent: str = "") -> str:
+        """解析下载直链；客户端接受关键字参数时带上播放端的 User-Agent"""
+        cap, fn = self._op("download_url", "p115client 未实现下载直链接口")
+        kwargs = {"headers": {"user-agent": user_agent}} if user_agent and cap.kwargs else {}
+        return str(self._call(fn, pickcode, **kwargs))
+
+    def rename(self, file_id: str, new_name: str) -> Any:
+        cap, fn = self._op("rename", "p115client 未实现重命名接口")
+        try:
+            if cap.arity == 2:
+                return self._call(fn, file_id, new_name)
+            return self._call(fn, {"fid": file_id, "file_name": new_name})
+        finally:
+            dir_index.invalidate_entries([file_id])
@@ -0,0 +1,115 @@
+# backend/core/p115_pool.py
+"""
+进程级 115 客户端注册表
+- 按 cookie 指纹（sha256 前 16 位）缓存 P115Wrapper，复用其中 p115client 的 HTTP 会话（keep-alive / TLS 复用）
+- cookie 只在 secrets.db 发生变化（mtime / size）时重新读取解密，平时每次取用只有一次 stat
+- cookie 变化后下一次取用自动换成新客户端；正在使用旧客户端的调用不受影响
+- lease() 统计借出次数、并发使用数与峰值，供诊断接口查看
+"""
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from core.db import SECRETS_DB, get_secret
+from core.logger import push_log
+from core.p115_client import P115Error, P115Wrapper
+
+COOKIE_KEY = "115_cookie"
+
+def _fingerprint(cookie: str) -> str:
+    return hashlib.sha256(cookie.encode("utf8")).hexdigest()[:16]
+
+class P115ClientPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._secret_sig: Optional[Tuple[int, int]] = None
+        self._cookie: Optional[str] = None
+        self._clients: Dict[str, P115Wrapper] = {}
+        self._created_at: Dict[str, float] = {}
+        self._in_use = 0
+        self.stats_counters = {"leases": 0, "peak_in_use": 0, "clients_created": 0, "cookie_reloads": 0, "errors": 0}
+
+    def _secret_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(SECRETS_DB)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def cookie(self) -> Optional[str]:
+        """返回当前 115 cookie；仅在 secrets.db 变化后才重新解密"""
+        sig = self._secret_signature()
+        with self._lock:
+            if sig is not None and sig == self._secret_sig:
+                return self._cookie
+        cookie = get_secret(COOKIE_KEY)
+        with self._lock:
+            if cookie != self._cookie:
+                # cookie 已更换：丢弃旧指纹的客户端
+                if self._cookie is not None:
+                    push_log("INFO", "115 cookie 已变更，重建客户端")
+                self._clients.clear()
+                self._created_at.clear()
+                self._cookie = cookie
+            self._secret_sig = sig
+            self.stats_counters["cookie_reloads"] += 1
+        return cookie
+
+    def get(self) -> P115Wrapper:
+        """返回当前 cookie 对应的常驻客户端（不存在时创建）"""
+        cookie = self.cookie()
+        fp = _fingerprint(cookie or "")
+        with self._lock:
+            client = self._clients.get(fp)
+            if client is not None:
+                return client
+            try:
+                client = P115Wrapper(cookie)
+            except P115Error:
+                self.stats_counters["errors"] += 1
+                raise
+            self._clients[fp] = client
+            self._created_at[fp] = time.time()
+            self.stats_counters["clients_created"] += 1
+            return client
+
+    @contextmanager
+    def lease(self) -> Iterator[P115Wrapper]:
+        """借出客户端；仅用于统计并发使用情况，客户端本身可被多个线程共享"""
+        client = self.get()
+        with self._lock:
+            self._in_use += 1
+            self.stats_counters["leases"] += 1
+            self.stats_counters["peak_in_use"] = max(self.stats_counters["peak_in_use"], self._in_use)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+    def invalidate(self):
+        """丢弃所有缓存的客户端和 cookie，下次取用时重新读取"""
+        with self._lock:
+            self._clients.clear()
+            self._created_at.clear()
+            self._cookie = None
+            self._secret_sig = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            return {
+                **self.stats_counters,
+                "in_use": self._in_use,
+                "has_cookie": bool(self._cookie),
+                "clients": [
+                    {"fingerprint": fp, "age": round(now - self._created_at[fp], 1)}
+                    for fp in self._clients
+                ],
+            }
+
+p115_pool = P115ClientPool()
@@ -1,30 +1,422 @@
 # backend/core/qps_limiter.py
+import asyncio
+import importlib
+import os
 import time
 import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# acquire 未指定 timeout 时的最长等待（秒）
+DEFAULT_MAX_WAIT = 60.0
+# AIMD 加性增长时，本地速率与已写入共享存储的速率相差超过该比例才写回（避免每次成功调用都写库）
+PERSIST_DELTA = 0.05
+
+# 令牌桶状态的存储后端（环境变量 QPS_LIMITER_BACKEND）：
+# - local:  进程内（默认），多个 uvicorn worker 各自计数
+# - sqlite: 同机多进程共享（QPS_LIMITER_DB 指定库文件）
+# - redis:  跨主机共享（QPS_LIMITER_REDIS_URL），需要安装 redis 包，不可用时回退到 sqlite
+BASE = Path(__file__).resolve().parent.parent
+QPS_DB = Path(os.getenv("QPS_LIMITER_DB", str(BASE / "qps.db")))
+
+class SqliteBucketStore:
+    """
+    基于 SQLite 的共享令牌桶：每次预订在 BEGIN IMMEDIATE 事务中完成（文件锁串行化），
+    同一台机器上的所有进程看到同一份令牌数和速率。时间使用墙上时钟，以便跨进程比较。
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS buckets (
+      service TEXT PRIMARY KEY,
+      tokens REAL NOT NULL,
+      last REAL NOT NULL,
+      rate REAL NOT NULL,
+      capacity REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _conn(self):
+        from core.db import open_store
+        return open_store(self.path, self.SCHEMA)
+
+    def _load(self, conn, service, rate, capacity, now):
+        row = conn.execute("SELECT tokens,last,rate,capacity FROM buckets WHERE service=?", (service,)).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO buckets(service,tokens,last,rate,capacity) VALUES(?,?,?,?,?)",
+                         (service, capacity, now, rate, capacity))
+            return capacity, rate, capacity
+        tokens, last, rate, capacity = row
+        return min(capacity, tokens + max(0.0, now - last) * rate), rate, capacity
+
+    def reserve(self, service: str, tokens: float, rate: float, capacity: float,
+                max_wait: float) -> Tuple[Optional[float], float, float]:
+        """返回 (等待秒数或 None, 共享速率, 共享容量)"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            cur, rate, capacity = self._load(conn, service, rate, capacity, now)
+            wait = max(0.0, (tokens - cur) / rate) if rate > 0 else float("inf")
+            if wait <= max_wait:
+                cur -= tokens
+            else:
+                wait = None
+            conn.execute("UPDATE buckets SET tokens=?, last=? WHERE service=?", (cur, now, service))
+            conn.commit()
+            return wait, rate, capacity
+        except Exception:
+            conn.rollback()
+            raise
+
+    def refund(self, service: str, tokens: float):
+        conn = self._conn()
+        conn.execute("UPDATE buckets SET tokens=MIN(capacity, tokens + ?) WHERE service=?", (tokens, service))
+        conn.commit()
+
+    def set_rate(self, service: str, rate: float, capacity: float):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            cur, _, _ = self._load(conn, service, rate, capacity, now)
+            conn.execute("UPDATE buckets SET tokens=?, last=?, rate=?, capacity=? WHERE service=?",
+                         (min(cur, capacity), now, rate, capacity, service))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def get_rate(self, service: str) -> Optional[Tuple[float, float]]:
+        row = self._conn().execute("SELECT rate,capacity FROM buckets WHERE service=?", (service,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def peek(self, service: str) -> Optional[float]:
+        row = self._conn().execute("SELECT tokens,last,rate,capacity FROM buckets WHERE service=?", (service,)).fetchone()
+        if row is None:
+            return None
+        tokens, last, rate, capacity = row
+        return min(capacity, tokens + max(0.0, time.time() - last) * rate)
+
+class RedisBucketStore:
+    """与 SqliteBucketStore 接口相同的 Redis 实现：预订逻辑在 Lua 脚本中原子执行"""
+    _RESERVE = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local h = redis.call('HMGET', KEYS[1], 'tokens', 'last', 'rate', 'capacity')
+    local rate = tonumber(h[3]) or tonumber(ARGV[2])
+    local cap = tonumber(h[4]) or tonumber(ARGV[3])
+    local cur = cap
+    if h[1] then cur = math.min(cap, tonumber(h[1]) + math.max(0, now - tonumber(h[2])) * rate) end
+    local need = tonumber(ARGV[1])
+    local wait = 0
+    if cur < need then wait = (need - cur) / rate end
+    local ok = 0
+    if wait <= tonumber(ARGV[4]) then cur = cur - need; ok = 1 end
+    redis.call('HSET', KEYS[1], 'tokens', cur, 'last', now, 'rate', rate, 'capacity', cap)
+    return {ok, tostring(wait), tostring(rate), tostring(cap)}
+    """
+
+    def __init__(self, url: str):
+        redis = importlib.import_module("redis")
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(self._RESERVE)
+
+    def _key(self, service: str) -> str:
+        return f"qps_limiter:{service}"
+
+    def reserve(self, service, tokens, rate, capacity, max_wait):
+        ok, wait, rate, capacity = self._script(keys=[self._key(service)], args=[tokens, rate, capacity, max_wait])
+        return (float(wait) if int(ok) else None), float(rate), float(capacity)
+
+    def refund(self, service, tokens):
+        self._redis.hincrbyfloat(self._key(service), "tokens", tokens)
+
+    def set_rate(self, service, rate, capacity):
+        self._redis.hset(self._key(service), mapping={"rate": rate, "capacity": capacity})
+
+    def get_rate(self, service):
+        rate, capacity = self._redis.hmget(self._key(service), "rate", "capacity")
+        return (float(rate), float(capacity)) if rate is not None and capacity is not None else None
+
+    def peek(self, service):
+        v = self._redis.hget(self._key(service), "tokens")
+        return float(v) if v is not None else None
+
+_store = None
+_store_loaded = False
+
+def _get_store():
+    global _store, _store_loaded
+    if _store_loaded:
+        return _store
+    _store_loaded = True
+    backend = os.getenv("QPS_LIMITER_BACKEND", "local").lower()
+    if backend == "redis":
+        try:
+            _store = RedisBucketStore(os.getenv("QPS_LIMITER_REDIS_URL", "redis://127.0.0.1:6379/0"))
+            return _store
+        except Exception as e:
+            from core.logger import push_log
+            push_log("WARN", f"Redis 限流后端不可用，回退到 SQLite: {e}")
+            backend = "sqlite"
+    if backend == "sqlite":
+        _store = SqliteBucketStore(QPS_DB)
+    return _store
 
 class TokenBucket:
-    def __init__(self, rate: float, capacity: float=None):
+    """
+    令牌桶限流器
+    - consume(): 非阻塞，令牌不足立即返回 False
+    - acquire(timeout) / acquire_async(timeout): 排队等待令牌（先到先得），
+      预计等待时间超过 timeout 时直接返回 False，不占用额度
+    令牌数允许为负，表示已被排队者预订的额度；预订在锁内按调用顺序进行，因此天然是 FIFO。
+    传入 store / service 时令牌状态保存在共享存储中（跨进程），否则保存在本对象内。
+    """
+    def __init__(self, rate: float, capacity: float=None, store=None, service: str=None):
         self.rate = rate
         self.capacity = capacity if capacity else rate
+        self.configured_rate = rate
+        self._store = store
+        self._service = service
         self._tokens = self.capacity
-        self._last = time.time()
+        self._last = time.monotonic()
         self._lock = threading.Lock()
+        self._waiting = 0
+        self._acquired = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        if store is not None:
+            self._init_store_rate()
+        # 最近一次写入共享存储的速率
+        self._persisted_rate = self.rate
+
+    def _init_store_rate(self):
+        """创建时把配置的速率写入共享存储，否则会一直沿用第一次建桶时保存的速率"""
+        self._store.set_rate(self._service, self.rate, self.capacity)
+
+    def reconfigure(self, rate: float, capacity: float = None):
+        """配置的 QPS 变化时更新速率（同时写入共享存储）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = self.configured_rate = rate
+            self.capacity = capacity if capacity else rate
+            self._persisted_rate = self.rate
+        if self._store is not None:
+            self._store.set_rate(self._service, self.rate, self.capacity)
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last = now
 
     def consume(self, tokens: float=1.0) -> bool:
+        if self._store is not None:
+            return self._reserve(tokens, 0.0) is not None
         with self._lock:
-            now = time.time()
-            elapsed = now - self._last
-            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
-            self._last = now
+            self._refill(time.monotonic())
             if self._tokens >= tokens:
                 self._tokens -= tokens
+                self._acquired += 1
                 return True
             return False
 
+    def _reserve(self, tokens: float, max_wait: Optional[float]) -> Optional[float]:
+        """预订令牌，返回需要等待的秒数；超过 max_wait 时返回 None（不预订）"""
+        if max_wait is None:
+            max_wait = DEFAULT_MAX_WAIT
+        if self._store is not None:
+            wait, rate, capacity = self._store.reserve(self._service, tokens, self.rate, self.capacity, max_wait)
+            with self._lock:
+                # 共享速率被其它进程调整过（AIMD / 重新配置）时以共享存储为准；
+                # 否则保留本地尚未写回的小幅增长
+                if rate != self._persisted_rate:
+                    self.rate, self.capacity = rate, capacity
+                    self._persisted_rate = rate
+                if wait is None:
+                    self._rejected += 1
+                else:
+                    self._acquired += 1
+                    self._wait_total += wait
+            return wait
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (tokens - self._tokens) / self.rate) if self.rate > 0 else float("inf")
+            if wait > max_wait:
+                self._rejected += 1
+                return None
+            self._tokens -= tokens
+            self._acquired += 1
+            self._wait_total += wait
+            return wait
+
+    def _refund(self, tokens: float):
+        if self._store is not None:
+            self._store.refund(self._service, tokens)
+            with self._lock:
+                self._acquired -= 1
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+            self._acquired -= 1
+
+    def acquire(self, tokens: float=1.0, timeout: Optional[float]=None) -> bool:
+        """线程侧阻塞获取"""
+        wait = self._reserve(tokens, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            with self._lock:
+                self._waiting += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        return True
+
+    async def acquire_async(self, tokens: float=1.0, timeout: Optional[float]=None) -> bool:
+        """协程侧获取，等待期间不阻塞事件循环；被取消时归还预订的令牌"""
+        if self._store is not None:
+            # 共享存储的预订是阻塞的 SQLite / Redis 调用，放到线程中执行
+            wait = await asyncio.to_thread(self._reserve, tokens, timeout)
+        else:
+            wait = self._reserve(tokens, timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            with self._lock:
+                self._waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._refund(tokens)
+                raise
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        shared = self._store.peek(self._service) if self._store is not None else None
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "backend": type(self._store).__name__ if self._store is not None else "local",
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(shared if shared is not None else self._tokens, 3),
+                "waiting": self._waiting,
+                "acquired": self._acquired,
+                "rejected": self._rejected,
+                "avg_wait": round(self._wait_total / self._acquired, 4) if self._acquired else 0.0,
+            }
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    AIMD 自适应限流：
+    - 调用成功：速率加性增长，每秒约增加 increase QPS（单次成功增加 increase / rate）
+    - 被上游限流：速率乘性下降（乘以 decrease），cooldown 秒内的连续限流只降一次
+    速率始终夹在 [floor, ceiling] 之间。
+    """
+    def __init__(self, rate: float, floor: float, ceiling: float,
+                 increase: float = 0.2, decrease: float = 0.5, cooldown: float = 2.0,
+                 store=None, service: str = None):
+        self.floor = floor
+        self.ceiling = max(floor, ceiling)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._last_throttle = 0.0
+        self._increases = 0
+        self._decreases = 0
+        super().__init__(rate=min(self.ceiling, max(floor, rate)), capacity=max(1, rate), store=store, service=service)
+
+    def _init_store_rate(self):
+        # 其它进程已按限流反馈把共享速率调低时沿用较低值，不因新进程启动而重置
+        shared = self._store.get_rate(self._service)
+        if shared is not None:
+            self.rate = min(self.ceiling, max(self.floor, min(self.rate, shared[0])))
+            self.capacity = max(1, self.rate)
+        super()._init_store_rate()
+
+    def _set_rate(self, rate: float, force: bool = False) -> Optional[Tuple[float, float]]:
+        """
+        调用方持有 self._lock。更新本地速率，返回需要写入共享存储的 (rate, capacity)：
+        只有 force、到达上下限或与上次写入相差超过 PERSIST_DELTA 时才写，写入由调用方在锁外完成
+        """
+        self._refill(time.monotonic())
+        new = min(self.ceiling, max(self.floor, rate))
+        self.rate = new
+        self.capacity = max(1, new)
+        if self._store is None or new == self._persisted_rate:
+            return None
+        if force or new in (self.floor, self.ceiling) or abs(new - self._persisted_rate) >= PERSIST_DELTA * self._persisted_rate:
+            self._persisted_rate = new
+            return new, self.capacity
+        return None
+
+    def _persist(self, update: Optional[Tuple[float, float]]):
+        if update is not None:
+            self._store.set_rate(self._service, *update)
+
+    def on_success(self):
+        update = None
+        with self._lock:
+            if self.rate < self.ceiling:
+                update = self._set_rate(self.rate + self.increase / self.rate)
+                self._increases += 1
+        self._persist(update)
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_throttle < self.cooldown:
+                return
+            self._last_throttle = now
+            update = self._set_rate(self.rate * self.decrease, force=True)
+            self._decreases += 1
+        self._persist(update)
+
+    def set_bounds(self, floor: float, ceiling: float):
+        with self._lock:
+            self.floor = floor
+            self.ceiling = max(floor, ceiling)
+            update = self._set_rate(self.rate, force=True)
+        self._persist(update)
+
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        with self._lock:
+            data.update({
+                "adaptive": True,
+                "floor": self.floor,
+                "ceiling": self.ceiling,
+                "increases": self._increases,
+                "decreases": self._decreases,
+                "last_throttle_ago": round(time.monotonic() - self._last_throttle, 1) if self._last_throttle else None,
+            })
+        return data
+
 # usage example: per-service limiters dict
 _limiters = {}
 
 def get_limiter(service: str, qps: float):
-    if service not in _limiters:
-        _limiters[service] = TokenBucket(rate=qps, capacity=max(1, qps))
-    return _limiters[service]
+    limiter = _limiters.get(service)
+    if limiter is None:
+        limiter = _limiters[service] = TokenBucket(rate=qps, capacity=max(1, qps), store=_get_store(), service=service)
+    elif not isinstance(limiter, AdaptiveRateLimiter) and limiter.configured_rate != qps:
+        # 配置的 QPS 改变后立即生效
+        limiter.reconfigure(qps, max(1, qps))
+    return limiter
+
+def get_adaptive_limiter(service: str, qps: float, floor: float, ceiling: float) -> AdaptiveRateLimiter:
+    limiter = _limiters.get(service)
+    if not isinstance(limiter, AdaptiveRateLimiter):
+        limiter = _limiters[service] = AdaptiveRateLimiter(rate=qps, floor=floor, ceiling=ceiling,
+                                                           store=_get_store(), service=service)
+    return limiter
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {service: limiter.stats() for service, limiter in _limiters.items()}
@@ -0,0 +1,100 @@
+# backend/core/strm_filter.py
+"""
+STRM 遍历过滤（只看遍历结果中的文件名 / 路径 / 大小，不发起任何请求）
+判断顺序与对应的跳过规则名：
+- excludeRegex   文件路径匹配时跳过（默认跳过 sample 片段）
+- includeRegex   配置后文件路径不匹配时跳过
+- 字幕 / NFO 等伴随文件（companionExtensions）不生成 .strm，交给 companionMode 复制或软链接；
+  未开启时按 companion 规则跳过
+- extension      配置了 extensions（如 "mkv,mp4,flac"）时扩展名不在其中；未配置时不按扩展名过滤
+- min_size / max_size  大小超出 minSize / maxSize（支持 KB/MB/GB 后缀，0 表示不限制）
+"""
+
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_COMPANION_EXTENSIONS = "srt,ass,ssa,sub,idx,sup,vtt,nfo"
+DEFAULT_EXCLUDE_REGEX = r"(?i)(^|[\W_])sample([\W_]|$)"
+COMPANION_MODES = ("off", "copy", "symlink")
+
+_UNITS = {"": 1, "b": 1, "k": 1 << 10, "kb": 1 << 10, "m": 1 << 20, "mb": 1 << 20,
+          "g": 1 << 30, "gb": 1 << 30, "t": 1 << 40, "tb": 1 << 40}
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*$")
+
+# 条目类型
+STRM = "strm"
+COMPANION = "companion"
+SKIP = "skip"
+
+def parse_size(value: Any) -> int:
+    """'50MB' / '1.5G' / 1024 -> 字节数；无法解析时为 0（不限制）"""
+    if value in (None, ""):
+        return 0
+    m = _SIZE_RE.match(str(value))
+    if not m or m.group(2).lower() not in _UNITS:
+        return 0
+    return int(float(m.group(1)) * _UNITS[m.group(2).lower()])
+
+def _ext_set(value: Any) -> frozenset:
+    return frozenset(e.strip().lower().lstrip(".") for e in str(value or "").split(",") if e.strip())
+
+def item_size(item: Dict[str, Any]) -> Optional[int]:
+    for key in ("size", "s", "file_size"):
+        try:
+            if item.get(key) is not None:
+                return int(item[key])
+        except (TypeError, ValueError):
+            pass
+    return None
+
+class StrmFilter:
+    def __init__(self, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        # 未配置时不按扩展名过滤：过滤掉的文件其已有 .strm 会在孤立清理时被删除（例如音频 .flac.strm）
+        self.extensions = _ext_set(conf.get("extensions"))
+        self.companion_extensions = _ext_set(conf.get("companionExtensions", DEFAULT_COMPANION_EXTENSIONS))
+        self.companion_mode = str(conf.get("companionMode") or "off").lower()
+        if self.companion_mode not in COMPANION_MODES:
+            self.companion_mode = "off"
+        self.companion_root = conf.get("companionSourceRoot") or ""
+        exclude = conf.get("excludeRegex", DEFAULT_EXCLUDE_REGEX)
+        include = conf.get("includeRegex")
+        self.exclude_re = re.compile(exclude) if exclude else None
+        self.include_re = re.compile(include) if include else None
+        self.min_size = parse_size(conf.get("minSize"))
+        self.max_size = parse_size(conf.get("maxSize"))
+        self.skipped: Counter = Counter()
+
+    def check(self, path: str, size: Optional[int] = None) -> Tuple[str, Optional[str]]:
+        """返回 (STRM / COMPANION / SKIP, 跳过规则名)，SKIP 时累计到 skipped"""
+        kind, rule = self._check(path, size)
+        if kind == SKIP:
+            self.skipped[rule] += 1
+        return kind, rule
+
+    def _check(self, path: str, size: Optional[int]) -> Tuple[str, Optional[str]]:
+        if self.exclude_re is not None and self.exclude_re.search(path):
+            return SKIP, "exclude_regex"
+        if self.include_re is not None and not self.include_re.search(path):
+            return SKIP, "include_regex"
+        ext = os.path.splitext(path)[1].lower().lstrip(".")
+        if ext in self.companion_extensions:
+            return (COMPANION, None) if self.companion_enabled else (SKIP, "companion")
+        if self.extensions and ext not in self.extensions:
+            return SKIP, "extension"
+        if size is not None:
+            if self.min_size and size < self.min_size:
+                return SKIP, "min_size"
+            if self.max_size and size > self.max_size:
+                return SKIP, "max_size"
+        return STRM, None
+
+    @property
+    def companion_enabled(self) -> bool:
+        return self.companion_mode != "off" and bool(self.companion_root)
+
+    def companion_source(self, path: str) -> str:
+        """伴随文件在本地挂载目录（companionSourceRoot）中的路径"""
+        return os.path.join(self.companion_root, path.lstrip("/"))
@@ -0,0 +1,184 @@
+# backend/core/strm_manifest.py
+"""
+STRM 生成清单（outputDir/.strm_manifest.db）
+- 记录每个来源（115 / 123 / OpenList）每个文件 id 上次写出的 相对路径、内容哈希、源文件修改时间
+- 源文件修改时间与路径都没变且 .strm 仍在时直接跳过（不解析下载地址、不写盘）；
+  内容哈希相同也不写盘；路径变化时删除旧文件
+- 同时记录决定 .strm 内容的配置指纹（地址前缀、redirectBase 等）；指纹变化后本轮不走
+  "源文件未变化" 的捷径，全部重新生成内容（内容相同的仍不写盘），完整结束后才保存新指纹
+- 一轮遍历完整结束后删除本轮未出现的条目对应的 .strm 文件及因此变空的目录；
+  遍历中途出错时不做清理，避免误删
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from core.db import open_store
+
+MANIFEST_NAME = ".strm_manifest.db"
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS strm_manifest (
+  source TEXT NOT NULL,
+  file_id TEXT NOT NULL,
+  rel_path TEXT NOT NULL,
+  content_hash TEXT NOT NULL,
+  mtime TEXT,
+  updated_at REAL NOT NULL,
+  PRIMARY KEY (source, file_id)
+);
+CREATE TABLE IF NOT EXISTS strm_manifest_meta (
+  source TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,
+  updated_at REAL NOT NULL
+);
+"""
+
+FLUSH_EVERY = 1000
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def settings_fingerprint(settings: Dict[str, Any]) -> str:
+    """决定 .strm 内容的配置（如 {"prefix": ..., "redirectBase": ...}）的指纹"""
+    return content_hash(json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str))
+
+class StrmManifest:
+    """
+    单个来源一轮生成过程中使用：
+        m = StrmManifest(out_dir, "115")
+        if m.is_current(fid, rel, mtime): continue     # 解析下载地址之前
+        if m.same_content(fid, rel, content): continue
+        ... 写文件 ...
+        m.record(fid, rel, content, mtime)
+        stats = m.finish(complete=True)
+    rel_path 为相对 out_dir 的 .strm 路径；fingerprint 为 settings_fingerprint(...)，不传时不比对配置
+    """
+
+    def __init__(self, out_dir: str, source: str, fingerprint: Optional[str] = None):
+        self.out_dir = out_dir
+        self.source = source
+        self.fingerprint = fingerprint
+        os.makedirs(out_dir, exist_ok=True)
+        self.db_path = os.path.join(out_dir, MANIFEST_NAME)
+        # file_id -> (rel_path, content_hash, mtime)
+        self._entries: Dict[str, Tuple[str, str, Optional[str]]] = {
+            r[0]: (r[1], r[2], r[3])
+            for r in self._conn().execute(
+                "SELECT file_id, rel_path, content_hash, mtime FROM strm_manifest WHERE source=?", (source,)
+            )
+        }
+        row = self._conn().execute("SELECT fingerprint FROM strm_manifest_meta WHERE source=?", (source,)).fetchone()
+        # 配置变化（或旧清单没有指纹）时已有的 .strm 可能过期，不能只凭修改时间跳过
+        self.settings_changed = fingerprint is not None and (row is None or row[0] != fingerprint)
+        self._seen = set()
+        self._pending = []
+        self.stats = {"written": 0, "unchanged": 0, "identical": 0, "removed": 0, "removed_dirs": 0}
+
+    def _conn(self):
+        return open_store(self.db_path, MANIFEST_SCHEMA)
+
+    def abs_path(self, rel_path: str) -> str:
+        return os.path.join(self.out_dir, rel_path)
+
+    def is_current(self, file_id: Any, rel_path: str, mtime: Any) -> bool:
+        """源文件与配置都未变化（路径、修改时间相同且 .strm 仍在磁盘上）时返回 True 并标记为本轮已见"""
+        file_id = str(file_id)
+        entry = self._entries.get(file_id)
+        if (self.settings_changed or entry is None or mtime is None or entry[0] != rel_path or entry[2] != str(mtime)
+                or not os.path.exists(self.abs_path(rel_path))):
+            return False
+        self._seen.add(file_id)
+        self.stats["unchanged"] += 1
+        return True
+
+    def same_content(self, file_id: Any, rel_path: str, content: str, mtime: Any = None) -> bool:
+        """内容与上次写出的完全相同时返回 True（只更新清单中的修改时间，不写盘）"""
+        file_id = str(file_id)
+        entry = self._entries.get(file_id)
+        digest = content_hash(content)
+        if entry is None or entry[0] != rel_path or entry[1] != digest or not os.path.exists(self.abs_path(rel_path)):
+            return False
+        self._seen.add(file_id)
+        self.stats["identical"] += 1
+        if mtime is not None and entry[2] != str(mtime):
+            self._stage(file_id, rel_path, digest, mtime)
+        return True
+
+    def keep(self, file_id: Any):
+        """保留已有条目（本轮处理失败的文件），不参与孤立文件清理"""
+        self._seen.add(str(file_id))
+
+    def record(self, file_id: Any, rel_path: str, content: str, mtime: Any = None):
+        """登记已写出的 .strm；同一文件换了路径时删除旧文件"""
+        file_id = str(file_id)
+        old = self._entries.get(file_id)
+        if old and old[0] != rel_path:
+            self._remove_file(old[0])
+        self._seen.add(file_id)
+        self.stats["written"] += 1
+        self._stage(file_id, rel_path, content_hash(content), mtime)
+
+    def _stage(self, file_id: str, rel_path: str, digest: str, mtime: Any):
+        mtime = None if mtime is None else str(mtime)
+        self._entries[file_id] = (rel_path, digest, mtime)
+        self._pending.append((self.source, file_id, rel_path, digest, mtime, time.time()))
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "REPLACE INTO strm_manifest(source,file_id,rel_path,content_hash,mtime,updated_at) VALUES(?,?,?,?,?,?)",
+                self._pending,
+            )
+        self._pending = []
+
+    def finish(self, complete: bool = True) -> Dict[str, int]:
+        """写入剩余清单；complete 为 True 时清理本轮未出现的孤立 .strm 与空目录"""
+        self.flush()
+        if complete:
+            orphans = [fid for fid in self._entries if fid not in self._seen]
+            for fid in orphans:
+                self._remove_file(self._entries.pop(fid)[0])
+            if orphans:
+                conn = self._conn()
+                with conn:
+                    conn.executemany(
+                        "DELETE FROM strm_manifest WHERE source=? AND file_id=?",
+                        [(self.source, fid) for fid in orphans],
+                    )
+            if self.settings_changed:
+                conn = self._conn()
+                with conn:
+                    conn.execute(
+                        "REPLACE INTO strm_manifest_meta(source,fingerprint,updated_at) VALUES(?,?,?)",
+                        (self.source, self.fingerprint, time.time()),
+                    )
+                self.settings_changed = False
+        return dict(self.stats)
+
+    def _remove_file(self, rel_path: str):
+        path = self.abs_path(rel_path)
+        try:
+            os.remove(path)
+            self.stats["removed"] += 1
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+        # 向上删除变空的目录，止于 out_dir
+        root = os.path.abspath(self.out_dir)
+        parent = os.path.dirname(os.path.abspath(path))
+        while parent.startswith(root + os.sep):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            self.stats["removed_dirs"] += 1
+            parent = os.path.dirname(parent)
@@ -0,0 +1,128 @@
+# backend/core/strm_redirect.py
+"""
+STRM 播放重定向的 115 直链缓存
+- STRM 文件内容为 {strm.redirectBase}/strm/115/{pickcode}，播放时才解析直链并 302 跳转
+- 直链与请求时的 User-Agent 绑定，缓存键为 (pickcode, User-Agent)
+- 缓存到直链过期前 strm.urlExpiryMargin 秒（默认 60）；直链中带过期时间戳 t 时以它为准，
+  否则缓存 strm.urlTtl 秒（默认 900）
+- 同一键的并发解析只发起一次 115 请求（single-flight），其余请求等待同一结果
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from core.db import get_config
+
+DEFAULT_URL_TTL = 900
+DEFAULT_EXPIRY_MARGIN = 60
+MAX_ENTRIES = 10000
+
+def _float_config(key: str, default: float) -> float:
+    try:
+        return float(get_config(key, default))
+    except Exception:
+        return default
+
+def url_expires_at(url: str, now: float) -> float:
+    """直链的过期时间：查询参数 t 为未来的 Unix 时间戳时使用它，否则按 strm.urlTtl 估计"""
+    try:
+        t = float(parse_qs(urlsplit(url).query).get("t", [""])[0])
+        if now < t < now + 7 * 86400:
+            return t
+    except (TypeError, ValueError):
+        pass
+    return now + _float_config("strm.urlTtl", DEFAULT_URL_TTL)
+
+def redirect_url(base: Optional[str], pickcode: Optional[str]) -> Optional[str]:
+    """生成 STRM 使用的重定向地址（base 为 strm.redirectBase）；未配置或没有 pickcode 时返回 None"""
+    if not base or not pickcode:
+        return None
+    return f"{base.rstrip('/')}/strm/115/{pickcode}"
+
+class DownloadUrlCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        # (pickcode, ua) -> (url, 缓存失效时间)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "joined": 0, "errors": 0}
+
+    def _get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put(self, key: Tuple[str, str], url: str):
+        now = time.time()
+        valid_until = url_expires_at(url, now) - _float_config("strm.urlExpiryMargin", DEFAULT_EXPIRY_MARGIN)
+        if valid_until <= now:
+            return
+        with self._lock:
+            self._entries[key] = (url, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _fetch(pickcode: str, user_agent: str) -> str:
+        from core.p115_pool import p115_pool
+        with p115_pool.lease() as p115:
+            return p115.download_url(pickcode, user_agent)
+
+    async def resolve(self, pickcode: str, user_agent: str = "") -> str:
+        key = (pickcode, user_agent or "")
+        url = self._get(key)
+        if url is not None:
+            self.stats_counters["hits"] += 1
+            return url
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats_counters["misses"] += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.stats_counters["joined"] += 1
+        # shield：某个播放请求断开不会取消其他请求正在等待的解析
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key: Tuple[str, str]) -> str:
+        url = await asyncio.to_thread(self._fetch, *key)
+        self._put(key, url)
+        return url
+
+    def _done(self, key: Tuple[str, str], task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats_counters["errors"] += 1
+
+    def invalidate(self, pickcode: Optional[str] = None) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if pickcode is None or k[0] == pickcode]
+            for k in keys:
+                del self._entries[k]
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"] + self.stats_counters["joined"]
+        return {
+            **self.stats_counters,
+            "hit_rate": round((lookups - self.stats_counters["misses"]) / lookups, 3) if lookups else None,
+            "entries": entries,
+            "inflight": len(self._inflight),
+        }
+
+download_url_cache = DownloadUrlCache()
@@ -0,0 +1,125 @@
+# backend/core/tmdb_cache.py
+"""
+TMDB 响应缓存（tmdb_cache.db）
+- 键：(接口, 规范化后的查询词, 年份, 语言)
+- 有结果的响应缓存 tmdb.cacheTtl 秒（默认 7 天），无结果的响应缓存 tmdb.negativeTtl 秒（默认 1 天）
+- HTTP 错误不缓存；命中 / 未命中 / 负缓存命中计数供 /api/tmdb/cache 查看
+"""
+
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from core.db import open_store, get_config
+
+BASE = Path(__file__).resolve().parent.parent
+TMDB_CACHE_DB = BASE / "tmdb_cache.db"
+
+TMDB_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tmdb_cache (
+  endpoint TEXT NOT NULL,
+  query TEXT NOT NULL,
+  year TEXT NOT NULL,
+  language TEXT NOT NULL,
+  value TEXT NOT NULL,
+  negative INTEGER NOT NULL DEFAULT 0,
+  created_at REAL NOT NULL,
+  expires_at REAL NOT NULL,
+  PRIMARY KEY (endpoint, query, year, language)
+);
+CREATE INDEX IF NOT EXISTS idx_tmdb_cache_expires ON tmdb_cache(expires_at);
+"""
+
+DEFAULT_TTL = 7 * 86400
+DEFAULT_NEGATIVE_TTL = 86400
+
+_SEP_RE = re.compile(r"[\s._\-]+")
+
+def normalize_query(q: Any) -> str:
+    """小写、分隔符（空格 . _ -）合并为单个空格，使 "The.Office" 与 "the office" 命中同一条缓存"""
+    return _SEP_RE.sub(" ", str(q)).strip().lower()
+
+def _float_config(key: str, default: float) -> float:
+    try:
+        return float(get_config(key, default))
+    except Exception:
+        return default
+
+class TmdbCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "negative_hits": 0, "misses": 0, "stores": 0}
+
+    def _conn(self):
+        return open_store(TMDB_CACHE_DB, TMDB_CACHE_SCHEMA)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats_counters[key] += 1
+
+    @staticmethod
+    def _key(endpoint: str, query: Any, year: Any, language: Optional[str]) -> Tuple[str, str, str, str]:
+        return endpoint, normalize_query(query), str(year or ""), language or ""
+
+    def lookup(self, endpoint: str, query: Any, year: Any = None, language: Optional[str] = None) -> Tuple[bool, Any]:
+        """返回 (是否命中, 缓存值)；负缓存命中时值为空结果"""
+        row = self._conn().execute(
+            "SELECT value, negative FROM tmdb_cache WHERE endpoint=? AND query=? AND year=? AND language=? AND expires_at>?",
+            self._key(endpoint, query, year, language) + (time.time(),),
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return False, None
+        self._count("negative_hits" if row[1] else "hits")
+        return True, json.loads(row[0])
+
+    def store(self, endpoint: str, query: Any, year: Any, language: Optional[str], value: Any,
+              negative: Optional[bool] = None):
+        """写入缓存；negative 未指定时空结果（[] / {} / None）视为负缓存"""
+        if negative is None:
+            negative = not value
+        ttl = _float_config("tmdb.negativeTtl" if negative else "tmdb.cacheTtl",
+                            DEFAULT_NEGATIVE_TTL if negative else DEFAULT_TTL)
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "REPLACE INTO tmdb_cache(endpoint,query,year,language,value,negative,created_at,expires_at) VALUES(?,?,?,?,?,?,?,?)",
+            self._key(endpoint, query, year, language)
+            + (json.dumps(value, ensure_ascii=False, default=str), int(negative), now, now + ttl),
+        )
+        conn.commit()
+        self._count("stores")
+
+    def purge(self, endpoint: Optional[str] = None, expired_only: bool = False) -> int:
+        """删除缓存条目（可按接口过滤 / 只删过期条目），返回删除数量"""
+        sql, params = "DELETE FROM tmdb_cache WHERE 1=1", []
+        if endpoint:
+            sql += " AND endpoint=?"
+            params.append(endpoint)
+        if expired_only:
+            sql += " AND expires_at<=?"
+            params.append(time.time())
+        conn = self._conn()
+        n = conn.execute(sql, params).rowcount
+        conn.commit()
+        return n
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        total, negative = conn.execute("SELECT COUNT(*), COALESCE(SUM(negative), 0) FROM tmdb_cache").fetchone()
+        expired = conn.execute("SELECT COUNT(*) FROM tmdb_cache WHERE expires_at<=?", (time.time(),)).fetchone()[0]
+        with self._lock:
+            counters = dict(self.stats_counters)
+        lookups = counters["hits"] + counters["negative_hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round((counters["hits"] + counters["negative_hits"]) / lookups, 3) if lookups else None,
+            "entries": total,
+            "negative_entries": negative,
+            "expired_entries": expired,
+        }
+
+tmdb_cache = TmdbCache()
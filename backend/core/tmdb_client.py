@@ -4,6 +4,7 @@ import time
 from typing import Optional, Dict, Any, List
 from core.db import get_secret, get_config
 from core.logger import push_log
+from core.tmdb_cache import tmdb_cache
 
 TMDB_API_URL = "https://api.themoviedb.org/3"
 
@@ -11,54 +12,44 @@ def _get_tmdb_key() -> Optional[str]:
     # 从 secrets 中读取 TMDB API Key（密文存储）
     return get_secret("tmdb_api_key", None)
 
-def search_movie_by_name(name: str, year: Optional[int] = None) -> List[Dict[str, Any]]:
+def _cached_get(endpoint: str, query: Any, year: Optional[int], path: str, params: Dict[str, Any],
+                pick, empty, label: str):
+    """
+    带缓存的 TMDB GET：先查 tmdb_cache，未命中才请求；
+    200 响应（包括空结果，作为负缓存）写入缓存，HTTP 错误不缓存。
+    """
+    hit, value = tmdb_cache.lookup(endpoint, query, year)
+    if hit:
+        return value if value else empty
     key = _get_tmdb_key()
     if not key:
-        push_log("WARN", "TMDB API Key 未配置，search_movie_by_name 返回空")
-        return []
-    params = {"api_key": key, "query": name, "include_adult": False}
+        push_log("WARN", f"TMDB API Key 未配置，{label} 返回空")
+        return empty
+    r = requests.get(f"{TMDB_API_URL}/{path}", params={"api_key": key, **params}, timeout=8)
+    if r.status_code != 200:
+        push_log("WARN", f"TMDB 请求失败（{label}）: {r.status_code}")
+        return empty
+    value = pick(r.json())
+    tmdb_cache.store(endpoint, query, year, None, value)
+    return value
+
+def search_movie_by_name(name: str, year: Optional[int] = None) -> List[Dict[str, Any]]:
+    params = {"query": name, "include_adult": False}
     if year:
         params["year"] = year
-    r = requests.get(f"{TMDB_API_URL}/search/movie", params=params, timeout=8)
-    if r.status_code != 200:
-        push_log("WARN", f"TMDB 搜索失败: {r.status_code}")
-        return []
-    data = r.json()
-    return data.get("results", [])
+    return _cached_get("search/movie", name, year, "search/movie", params,
+                       lambda d: d.get("results", []), [], "search_movie_by_name")
 
 def get_movie_details(tmdb_id: int) -> Dict[str, Any]:
-    key = _get_tmdb_key()
-    if not key:
-        push_log("WARN", "TMDB API Key 未配置，get_movie_details 返回空")
-        return {}
-    r = requests.get(f"{TMDB_API_URL}/movie/{tmdb_id}", params={"api_key": key}, timeout=8)
-    if r.status_code != 200:
-        push_log("WARN", f"TMDB 获取详情失败: {r.status_code}")
-        return {}
-    return r.json()
+    return _cached_get("movie", tmdb_id, None, f"movie/{tmdb_id}", {}, lambda d: d, {}, "get_movie_details")
 
 def search_tv_by_name(name: str, year: Optional[int] = None) -> List[Dict[str, Any]]:
-    key = _get_tmdb_key()
-    if not key:
-        push_log("WARN", "TMDB API Key 未配置，search_tv_by_name 返回空")
-        return []
-    params = {"api_key": key, "query": name}
-    r = requests.get(f"{TMDB_API_URL}/search/tv", params=params, timeout=8)
-    if r.status_code != 200:
-        push_log("WARN", f"TMDB TV 搜索失败: {r.status_code}")
-        return []
-    return r.json().get("results", [])
+    # TV 搜索不传年份，缓存键也不区分年份
+    return _cached_get("search/tv", name, None, "search/tv", {"query": name},
+                       lambda d: d.get("results", []), [], "search_tv_by_name")
 
 def get_tv_details(tmdb_id: int) -> Dict[str, Any]:
-    key = _get_tmdb_key()
-    if not key:
-        push_log("WARN", "TMDB API Key 未配置，get_tv_details 返回空")
-        return {}
-    r = requests.get(f"{TMDB_API_URL}/tv/{tmdb_id}", params={"api_key": key}, timeout=8)
-    if r.status_code != 200:
-        push_log("WARN", f"TMDB 获取 TV 详情失败: {r.status_code}")
-        return {}
-    return r.json()
+    return _cached_get("tv", tmdb_id, None, f"tv/{tmdb_id}", {}, lambda d: d, {}, "get_tv_details")
 
 # 可选：AI 辅助识别占位（如果配置了 OPENAI_KEY，可调用）
 def ai_assist_identify(name: str, candidates: List[Dict[str,Any]]) -> Optional[Dict[str,Any]]:
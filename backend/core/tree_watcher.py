@@ -0,0 +1,211 @@
+# backend/core/tree_watcher.py
+"""
+115 目录变更监视器（快照对比）
+- 配置 watcher.roots 指定要监视的目录，格式 "cid=/路径,cid2=/路径2"（只写 cid 时路径为空）
+- 每轮从根目录开始，只重新列出修改时间（te）与上次快照不同的子目录，未变化的子树整棵跳过
+- 对比快照得到 新增 / 删除 / 移动（同一 id 出现在新目录）的条目；新增文件送入
+  重命名 → STRM → Emby 的处理流程（提交为 BULK 任务），移动的条目不重复处理
+- 每个根目录第一次扫描只建立基线快照，不触发处理
+- 115 的目录修改时间只反映直接子条目的变化，因此每 watcher.fullScanEvery 轮做一次全量扫描兜底
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.db import open_store, get_config
+from core.dir_index import DIR_INDEX_DB, dir_index, normalize_entry
+from core.logger import push_log
+
+WATCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watch_entries (
+  parent_cid TEXT NOT NULL,
+  id TEXT NOT NULL,
+  root TEXT NOT NULL,
+  name TEXT,
+  path TEXT,
+  is_dir INTEGER NOT NULL DEFAULT 0,
+  mtime TEXT,
+  PRIMARY KEY (parent_cid, id)
+);
+CREATE INDEX IF NOT EXISTS idx_watch_entries_root ON watch_entries(root);
+CREATE TABLE IF NOT EXISTS watch_roots (
+  root TEXT PRIMARY KEY,
+  path TEXT,
+  scans INTEGER NOT NULL DEFAULT 0,
+  last_scan REAL
+);
+"""
+
+DEFAULT_INTERVAL = 600
+DEFAULT_FULL_SCAN_EVERY = 24
+
+def _int_config(key: str, default: int) -> int:
+    try:
+        return max(1, int(get_config(key, default)))
+    except Exception:
+        return default
+
+def parse_roots(value: Optional[str]) -> List[Tuple[str, str]]:
+    roots = []
+    for token in (value or "").split(","):
+        token = token.strip()
+        if not token:
+            continue
+        cid, _, path = token.partition("=")
+        roots.append((cid.strip(), path.strip().rstrip("/")))
+    return roots
+
+class TreeWatcher:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self.stats = {"scans": 0, "dirs_listed": 0, "dirs_skipped": 0, "added": 0, "removed": 0, "moved": 0, "submitted_tasks": 0}
+        self.last_scan: Dict[str, Any] = {}
+
+    def _conn(self):
+        return open_store(DIR_INDEX_DB, WATCH_SCHEMA)
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="tree-watcher", daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        """立即开始下一轮扫描"""
+        self.start()
+        self._wake.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        rows = self._conn().execute("SELECT root,path,scans,last_scan FROM watch_roots").fetchall()
+        return {
+            **self.stats,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "roots": [dict(zip(("root", "path", "scans", "last_scan"), r)) for r in rows],
+            "last_scan": self.last_scan,
+        }
+
+    # ------------------------------------------------------------------
+    # 后台扫描
+    # ------------------------------------------------------------------
+
+    def _loop(self):
+        while True:
+            try:
+                self.scan_all()
+            except Exception as e:
+                push_log("ERROR", f"目录变更扫描异常: {e}")
+            self._wake.wait(timeout=_int_config("watcher.interval", DEFAULT_INTERVAL))
+            self._wake.clear()
+
+    def scan_all(self):
+        from core.p115_pool import p115_pool
+        roots = parse_roots(get_config("watcher.roots", ""))
+        if not roots or not p115_pool.cookie():
+            return
+        full_every = _int_config("watcher.fullScanEvery", DEFAULT_FULL_SCAN_EVERY)
+        with self._scan_lock, p115_pool.lease() as p115:
+            for root, path in roots:
+                row = self._conn().execute("SELECT scans FROM watch_roots WHERE root=?", (root,)).fetchone()
+                scans = row[0] if row else 0
+                self.scan_root(p115, root, path, initial=row is None, full=row is None or scans % full_every == 0)
+
+    def scan_root(self, p115, root: str, root_path: str, initial: bool = False, full: bool = False) -> Dict[str, Any]:
+        started = time.time()
+        conn = self._conn()
+        added: Dict[str, Dict[str, Any]] = {}
+        removed: Dict[str, Dict[str, Any]] = {}
+        listed = skipped = 0
+        queue = deque([(root, root_path)])
+        while queue:
+            cid, path = queue.popleft()
+            # 重新列出前失效目录索引，列表结果同时刷新索引
+            dir_index.invalidate(cid)
+            new: Dict[str, Dict[str, Any]] = {}
+            for item in p115.iter_files(cid):
+                e = normalize_entry(item)
+                e["parent_cid"] = cid
+                e["path"] = f"{path}/{e['name']}"
+                new[e["id"]] = e
+            listed += 1
+            old = {
+                r[0]: {"id": r[0], "name": r[1], "path": r[2], "is_dir": bool(r[3]), "mtime": r[4], "parent_cid": cid}
+                for r in conn.execute("SELECT id,name,path,is_dir,mtime FROM watch_entries WHERE parent_cid=?", (cid,))
+            }
+            for entry_id, e in new.items():
+                if not e["is_dir"]:
+                    continue
+                prev = old.get(entry_id)
+                if full or prev is None or prev["mtime"] != e["mtime"] or prev["path"] != e["path"]:
+                    queue.append((entry_id, e["path"]))
+                else:
+                    skipped += 1
+            for entry_id in new.keys() - old.keys():
+                added[entry_id] = new[entry_id]
+            for entry_id in old.keys() - new.keys():
+                removed[entry_id] = old[entry_id]
+            with conn:
+                conn.execute("DELETE FROM watch_entries WHERE parent_cid=?", (cid,))
+                conn.executemany(
+                    "INSERT INTO watch_entries(parent_cid,id,root,name,path,is_dir,mtime) VALUES(?,?,?,?,?,?,?)",
+                    [(cid, e["id"], root, e["name"], e["path"], int(e["is_dir"]), e["mtime"]) for e in new.values()],
+                )
+
+        moved = added.keys() & removed.keys()
+        # 真正删除的目录：连同快照中的子树一起清掉
+        with conn:
+            for entry_id, e in removed.items():
+                if e["is_dir"] and entry_id not in moved:
+                    self._drop_subtree(conn, entry_id)
+            conn.execute(
+                "INSERT INTO watch_roots(root,path,scans,last_scan) VALUES(?,?,1,?) "
+                "ON CONFLICT(root) DO UPDATE SET path=excluded.path, scans=scans+1, last_scan=excluded.last_scan",
+                (root, root_path, time.time()),
+            )
+
+        new_files = [e["path"] for entry_id, e in added.items() if entry_id not in moved and not e["is_dir"]]
+        result = {
+            "root": root, "initial": initial, "full": full,
+            "dirs_listed": listed, "dirs_skipped": skipped,
+            "added": len(added) - len(moved), "removed": len(removed) - len(moved), "moved": len(moved),
+            "new_files": len(new_files), "duration": round(time.time() - started, 2),
+        }
+        self.stats["scans"] += 1
+        self.stats["dirs_listed"] += listed
+        self.stats["dirs_skipped"] += skipped
+        if not initial:
+            self.stats["added"] += result["added"]
+            self.stats["removed"] += result["removed"]
+            self.stats["moved"] += result["moved"]
+        self.last_scan = result
+
+        if initial:
+            push_log("INFO", f"目录监视基线快照完成: {root_path or root}，共列出 {listed} 个目录")
+        elif new_files:
+            self._submit(new_files, root_path)
+        return result
+
+    def _drop_subtree(self, conn, cid: str):
+        stack = [cid]
+        while stack:
+            cur = stack.pop()
+            stack.extend(r[0] for r in conn.execute("SELECT id FROM watch_entries WHERE parent_cid=? AND is_dir=1", (cur,)))
+            conn.execute("DELETE FROM watch_entries WHERE parent_cid=?", (cur,))
+
+    def _submit(self, files: List[str], base_dir: str):
+        from task_queue import submit_task, TaskPriority
+        from utils.pipeline import run_media_pipeline
+
+        def job(update_progress):
+            return run_media_pipeline(files, base_dir or "/", update_progress=update_progress)
+
+        tid = submit_task(job, priority=TaskPriority.BULK)
+        self.stats["submitted_tasks"] += 1
+        push_log("INFO", f"检测到 {len(files)} 个新文件，已提交整理任务 (task_id={tid})")
+
+tree_watcher = TreeWatcher()
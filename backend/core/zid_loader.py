@@ -1,14 +1,140 @@
 # backend/core/zid_loader.py
-import yaml
+"""
+zid.yml 加载与热更新
+- 查找顺序：环境变量 ZID_PATH → backend/zid.yml → 项目根目录 zid.yml（Docker 镜像中为 /app/zid.yml）
+- 后台线程每 zid.reloadInterval 秒（默认 5）检查文件的修改时间 / 大小，变化后在线程中解析、校验、编译，
+  成功后整体替换当前规则快照（版本号 +1）；解析或校验失败时保留旧规则并记录错误
+- 调用方每次使用时取 zid_registry.current()，拿到的快照在一次整理过程中保持不变
+"""
+
+import os
+import threading
+import time
 from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import yaml
+
+from core.zid_rules import CompiledRules, ZidRuleError, compile_rules
+
 BASE = Path(__file__).resolve().parent.parent
-ZID = BASE / "zid.yml"
+DEFAULT_RELOAD_INTERVAL = 5
+
+def _candidates():
+    env = os.environ.get("ZID_PATH")
+    if env:
+        return [Path(env)]
+    return [BASE / "zid.yml", BASE.parent / "zid.yml"]
+
+def find_zid() -> Path:
+    for p in _candidates():
+        if p.exists():
+            return p
+    return _candidates()[0]
+
+ZID = find_zid()
+
+class ZidSnapshot(NamedTuple):
+    version: int
+    raw: Dict[str, Any]
+    compiled: CompiledRules
+    path: str
+    loaded_at: float
+
+class ZidRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._snapshot = ZidSnapshot(0, {}, compile_rules({}), str(ZID), time.time())
+        self.last_error: Optional[str] = None
+        self.reloads = 0
+
+    def current(self) -> ZidSnapshot:
+        return self._snapshot
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            st = path.stat()
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def check(self, force: bool = False) -> bool:
+        """文件有变化（或 force）时重新加载；返回是否换上了新规则"""
+        with self._lock:
+            path = find_zid()
+            signature = self._stat(path)
+            if not force and signature == self._signature and str(path) == self._snapshot.path:
+                return False
+            self._signature = signature
+            try:
+                raw = {}
+                if signature is not None:
+                    with open(path, "r", encoding="utf8") as f:
+                        raw = yaml.safe_load(f) or {}
+                compiled = compile_rules(raw)
+            except (OSError, yaml.YAMLError, ZidRuleError) as e:
+                self.last_error = f"{path}: {e}"
+                self._log("ERROR", f"zid.yml 加载失败，继续使用版本 {self._snapshot.version}: {e}")
+                return False
+            # 单次赋值替换快照，读取方不加锁也只会看到完整的旧规则或新规则
+            self._snapshot = ZidSnapshot(self._snapshot.version + 1, raw, compiled, str(path), time.time())
+            self.last_error = None
+            self.reloads += 1
+        if self._snapshot.version > 1:
+            self._log("INFO", f"zid.yml 已重新加载（版本 {self._snapshot.version}）")
+        return True
+
+    @staticmethod
+    def _log(level: str, msg: str):
+        try:
+            from core.logger import push_log
+            push_log(level, msg)
+        except Exception:
+            pass
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="zid-reloader", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                from core.db import get_config
+                interval = float(get_config("zid.reloadInterval", DEFAULT_RELOAD_INTERVAL))
+            except Exception:
+                interval = DEFAULT_RELOAD_INTERVAL
+            time.sleep(max(1.0, interval))
+            try:
+                self.check()
+            except Exception as e:
+                self._log("ERROR", f"zid.yml 检查异常: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        snap = self._snapshot
+        return {
+            "version": snap.version,
+            "path": snap.path,
+            "loaded_at": snap.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "watching": bool(self._thread and self._thread.is_alive()),
+            "categories": {mt: snap.compiled.categories(mt) for mt in snap.compiled.rules},
+        }
+
+zid_registry = ZidRegistry()
+zid_registry.check(force=True)
 
-def load_zid():
-    if not ZID.exists():
-        return {}
-    with open(ZID, "r", encoding="utf8") as f:
-        return yaml.safe_load(f)
+def load_zid() -> Dict[str, Any]:
+    """当前生效的 zid.yml 内容（原始字典）"""
+    return zid_registry.current().raw
 
-# 可在启动时加载并缓存
-ZID_CACHE = load_zid()
+def __getattr__(name):
+    # 兼容旧代码的 ZID_CACHE：按属性访问时返回当前版本
+    if name == "ZID_CACHE":
+        return load_zid()
+    raise AttributeError(name)
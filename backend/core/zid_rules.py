@@ -0,0 +1,210 @@
+# backend/core/zid_rules.py
+"""
+zid.yml 分类规则编译器
+- 加载时把每个分类的条件编译成谓词：逗号分隔的值 → 集合，`YYYY-YYYY` / `a-b` → 数值区间，`!值` → 排除
+- 支持 original_language、production_countries / origin_country、genre_ids、release_year
+  以及 TMDB 详情中的任意一级字段（标量、列表、{id/iso_3166_1/iso_639_1/name} 对象列表）
+- 分类按 zid.yml 中的先后顺序匹配，没有条件的分类匹配一切（兜底分类）；都不匹配时返回 DEFAULT_CATEGORY
+- 每个条目的字段只提取一次（只提取规则引用到的字段），classify(infos) 批量分类
+
+python -m core.zid_rules [zid.yml] [条目数]  运行分类微基准
+"""
+
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+DEFAULT_CATEGORY = "未分类"
+MEDIA_TYPES = ("movie", "tv")
+
+_RANGE_RE = re.compile(r"^(\d+(?:\.\d+)?)?\s*-\s*(\d+(?:\.\d+)?)?$")
+# 对象列表中用于匹配的键（genres → id，production_countries → iso_3166_1 ...）
+_OBJECT_KEYS = ("id", "iso_3166_1", "iso_639_1", "name")
+
+class ZidRuleError(ValueError):
+    pass
+
+def _get(info: Any, field: str) -> Any:
+    if isinstance(info, dict):
+        return info.get(field)
+    return getattr(info, field, None)
+
+def _values_of(value: Any) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, bool):
+        return [str(value).lower()]
+    if isinstance(value, (list, tuple, set)):
+        out = []
+        for v in value:
+            if isinstance(v, dict) or hasattr(v, "get"):
+                out.extend(str(v.get(k)).lower() for k in _OBJECT_KEYS if v.get(k) is not None)
+            elif hasattr(v, "id"):
+                out.append(str(v.id).lower())
+            else:
+                out.append(str(v).lower())
+        return out
+    return [str(value).lower()]
+
+def _field_values(info: Any, field: str) -> List[str]:
+    """提取字段值（小写字符串），处理 zid.yml 约定的别名字段"""
+    if field == "genre_ids":
+        vals = _values_of(_get(info, "genre_ids"))
+        return vals or [v for g in (_get(info, "genres") or []) for v in _values_of([g])[:1]]
+    if field in ("origin_country", "production_countries"):
+        other = "production_countries" if field == "origin_country" else "origin_country"
+        return _values_of(_get(info, field)) or _values_of(_get(info, other))
+    if field == "release_year":
+        date = _get(info, "release_date") or _get(info, "first_air_date") or ""
+        return [str(date)[:4]] if str(date)[:4].isdigit() else []
+    return _values_of(_get(info, field))
+
+def _to_numbers(values: Iterable[str]) -> Tuple[float, ...]:
+    nums = []
+    for v in values:
+        try:
+            nums.append(float(v))
+        except ValueError:
+            pass
+    return tuple(nums)
+
+class Predicate:
+    """单个字段的条件：包含值集合 / 区间，以及排除值集合 / 区间"""
+    __slots__ = ("field", "include", "exclude", "include_ranges", "exclude_ranges")
+
+    def __init__(self, field: str, spec: Any):
+        self.field = field
+        include, exclude, inc_r, exc_r = set(), set(), [], []
+        tokens = spec if isinstance(spec, list) else str(spec).split(",")
+        for token in tokens:
+            token = str(token).strip()
+            negate = token.startswith("!")
+            token = token.lstrip("!").strip().lower()
+            if not token:
+                continue
+            m = _RANGE_RE.match(token)
+            if m and (m.group(1) or m.group(2)):
+                lo = float(m.group(1)) if m.group(1) else float("-inf")
+                hi = float(m.group(2)) if m.group(2) else float("inf")
+                if lo > hi:
+                    raise ZidRuleError(f"{field}: 区间下限大于上限: {token}")
+                (exc_r if negate else inc_r).append((lo, hi))
+            else:
+                (exclude if negate else include).add(token)
+        self.include: FrozenSet[str] = frozenset(include)
+        self.exclude: FrozenSet[str] = frozenset(exclude)
+        self.include_ranges = tuple(inc_r)
+        self.exclude_ranges = tuple(exc_r)
+
+    def matches(self, values: FrozenSet[str], nums: Tuple[float, ...]) -> bool:
+        if self.exclude and not self.exclude.isdisjoint(values):
+            return False
+        if self.exclude_ranges and any(lo <= n <= hi for n in nums for lo, hi in self.exclude_ranges):
+            return False
+        if not self.include and not self.include_ranges:
+            return True
+        if self.include and not self.include.isdisjoint(values):
+            return True
+        return any(lo <= n <= hi for n in nums for lo, hi in self.include_ranges)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "field": self.field,
+            "include": sorted(self.include), "exclude": sorted(self.exclude),
+            "include_ranges": [list(r) for r in self.include_ranges],
+            "exclude_ranges": [list(r) for r in self.exclude_ranges],
+        }
+
+class CompiledRules:
+    def __init__(self, rules: Dict[str, List[Tuple[str, Tuple[Predicate, ...]]]]):
+        self.rules = rules
+        # 每种媒体类型规则引用到的字段，提取条目字段时只处理这些
+        self.fields = {
+            mt: tuple(dict.fromkeys(p.field for _, preds in rs for p in preds)) for mt, rs in rules.items()
+        }
+        self._numeric = {
+            mt: frozenset(p.field for _, preds in rs for p in preds if p.include_ranges or p.exclude_ranges)
+            for mt, rs in rules.items()
+        }
+
+    def categories(self, media_type: str) -> List[str]:
+        return [cat for cat, _ in self.rules.get(media_type, [])]
+
+    def _facts(self, info: Any, media_type: str) -> Dict[str, Tuple[FrozenSet[str], Tuple[float, ...]]]:
+        numeric = self._numeric[media_type]
+        facts = {}
+        for field in self.fields[media_type]:
+            values = _field_values(info, field)
+            facts[field] = (frozenset(values), _to_numbers(values) if field in numeric else ())
+        return facts
+
+    def classify_one(self, info: Any, media_type: str = "movie") -> str:
+        rules = self.rules.get(media_type)
+        if not rules or info is None:
+            return DEFAULT_CATEGORY
+        facts = self._facts(info, media_type)
+        for cat, preds in rules:
+            if all(p.matches(*facts[p.field]) for p in preds):
+                return cat
+        return DEFAULT_CATEGORY
+
+    def classify(self, infos: Iterable[Any], media_type: str = "movie") -> List[str]:
+        """批量分类，返回与 infos 顺序一致的分类名列表"""
+        return [self.classify_one(info, media_type) for info in infos]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            mt: [{"category": cat, "conditions": [p.describe() for p in preds]} for cat, preds in rs]
+            for mt, rs in self.rules.items()
+        }
+
+def compile_rules(raw: Optional[Dict[str, Any]]) -> CompiledRules:
+    """编译 zid.yml 内容；结构不合法时抛出 ZidRuleError"""
+    if raw is None:
+        raw = {}
+    if not isinstance(raw, dict):
+        raise ZidRuleError("zid.yml 顶层必须是映射（movie / tv）")
+    rules: Dict[str, List[Tuple[str, Tuple[Predicate, ...]]]] = {}
+    for media_type in MEDIA_TYPES:
+        section = raw.get(media_type) or {}
+        if not isinstance(section, dict):
+            raise ZidRuleError(f"{media_type} 必须是 分类名 → 条件 的映射")
+        compiled = []
+        for cat, conds in section.items():
+            if conds is None:
+                conds = {}
+            if not isinstance(conds, dict):
+                raise ZidRuleError(f"{media_type}.{cat}: 条件必须是 字段 → 值 的映射")
+            compiled.append((str(cat), tuple(Predicate(str(f), v) for f, v in conds.items() if v is not None)))
+        rules[media_type] = compiled
+    return CompiledRules(rules)
+
+def _benchmark(path: str, n: int):
+    import random
+    import time
+    import yaml
+
+    with open(path, "r", encoding="utf8") as f:
+        compiled = compile_rules(yaml.safe_load(f))
+    rnd = random.Random(0)
+    genres = [16, 99, 10762, 10764, 18, 28, 35]
+    countries = ["CN", "JP", "US", "KR", "GB", "HK"]
+    langs = ["zh", "ja", "en", "ko", "fr"]
+    infos = [{
+        "genres": [{"id": g} for g in rnd.sample(genres, 2)],
+        "origin_country": [rnd.choice(countries)],
+        "original_language": rnd.choice(langs),
+        "first_air_date": f"{rnd.randint(1980, 2025)}-01-01",
+    } for _ in range(n)]
+    for media_type in MEDIA_TYPES:
+        start = time.perf_counter()
+        cats = compiled.classify(infos, media_type)
+        elapsed = time.perf_counter() - start
+        top = {c: cats.count(c) for c in compiled.categories(media_type) + [DEFAULT_CATEGORY]}
+        print(f"{media_type}: {n} 条 {elapsed * 1000:.1f} ms，{elapsed / n * 1e6:.2f} µs/条  {top}")
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    _path = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parents[2] / "zid.yml")
+    _benchmark(_path, int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
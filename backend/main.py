@@ -95,13 +95,15 @@ try:
 except Exception:
     def get_limiter(service: str, qps: int):
         class Dummy:
-            def consume(self): return True
+            def consume(self, tokens=1.0): return True
+            def acquire(self, tokens=1.0, timeout=None): return True
+            async def acquire_async(self, tokens=1.0, timeout=None): return True
         return Dummy()
 
 try:
-    from core.zid_loader import ZID_CACHE, load_zid
+    from core.zid_loader import load_zid, zid_registry
 except Exception:
-    ZID_CACHE: Dict[str, Any] = {}
+    zid_registry = None
     def load_zid(): return {}
 
 # --- FastAPI 实例 ---
@@ -119,13 +121,29 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     _initialize_default_admin()
+    # 恢复重启前未完成的离线任务跟踪
+    try:
+        from core.offline_tracker import offline_tracker
+        offline_tracker.start()
+    except Exception as e:
+        write_log(f"WARNING: Failed to start offline tracker: {e}")
+    # 配置了监视目录时启动 115 目录变更监视器
+    try:
+        if get_config("watcher.roots", ""):
+            from core.tree_watcher import tree_watcher
+            tree_watcher.start()
+    except Exception as e:
+        write_log(f"WARNING: Failed to start tree watcher: {e}")
+    # zid.yml 修改后自动重新加载分类规则
+    if zid_registry is not None:
+        zid_registry.start()
 
 # --- 路由自动加载 ---
-def _include_router(module_name: str):
+def _include_router(module_name: str, prefix: str = "/api"):
     try:
         mod = __import__(module_name, fromlist=["router"])
         if hasattr(mod, "router"):
-            app.include_router(mod.router, prefix="/api")
+            app.include_router(mod.router, prefix=prefix)
     except Exception:
         pass
 
@@ -137,6 +155,10 @@ _include_router("router.notify")
 _include_router("router.tmdb")
 _include_router("router.emby")
 _include_router("router.health")
+_include_router("router.task")
+_include_router("router.diagnostics")
+# STRM 文件直接指向 /strm/115/{pickcode}，不带 /api 前缀
+_include_router("router.strm", prefix="")
 
 if settings_router:
     app.include_router(settings_router)
@@ -10,7 +10,7 @@
 
 import re
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import shutil
 import os
 
@@ -35,9 +35,31 @@ TV_RE_ALT = re.compile(r"(?P<show>.+?)[\.\s_\-](?P<season>\d{1,2})x(?P<episode>\
 def _normalize_title(s: str):
     return s.replace('.', ' ').replace('_', ' ').strip()
 
+def series_key(name: str) -> Optional[Tuple[str, int]]:
+    """剧集文件的分组键 (规范化剧名, 季号)；不是剧集时返回 None"""
+    m = TV_RE.search(name) or TV_RE_ALT.search(name)
+    if not m:
+        return None
+    show = re.sub(r"\s+", " ", _normalize_title(m.group("show"))).lower()
+    return show, int(m.group("season"))
+
+def group_label(key: Optional[Tuple[str, int]]) -> Optional[str]:
+    return f"{key[0]} S{key[1]:02d}" if key else None
+
+def group_by_series(items: List[Any], name_of: Callable[[Any], str] = lambda x: x) -> List[Tuple[Optional[Tuple[str, int]], List[Any]]]:
+    """
+    按 (剧名, 季) 聚类：同一季的所有集为一组，只需识别一次；
+    非剧集文件各自单独成组（键为 None）。保持首次出现的顺序。
+    """
+    groups: Dict[Any, Tuple[Optional[Tuple[str, int]], List[Any]]] = {}
+    for i, item in enumerate(items):
+        key = series_key(name_of(item))
+        groups.setdefault(key if key else ("", i), (key, []))[1].append(item)
+    return list(groups.values())
+
 def preview_organize(rules: Dict[str, Any], src_dir: str):
     """
-    返回操作预览：列表[{src, dst или None, reason}]
+    返回操作预览：列表[{src, dst или None, reason, group}]，group 为剧集分组（"剧名 S01"），非剧集为 None
     rules 可包含 movie_pattern, tv_pattern, type (auto/movie/tv)
     """
     p = Path(src_dir)
@@ -72,7 +94,7 @@ def preview_organize(rules: Dict[str, Any], src_dir: str):
                     reason = "movie_match"
                 else:
                     reason = "no_match"
-            ops.append({"src": str(f), "dst": rel_dst, "reason": reason})
+            ops.append({"src": str(f), "dst": rel_dst, "reason": reason, "group": group_label(series_key(name))})
     return ops
 
 def run_organize(rules: Dict[str, Any], src_dir: str, dry_run: bool=False):
@@ -0,0 +1,48 @@
+# backend/router/diagnostics.py
+"""
+运行时诊断路由（只读，不触发任何外部请求）
+- GET /api/diagnostics/limiters  各服务限流器的速率、剩余令牌、排队数
+- POST /api/diagnostics/limiters/115  调整 115 自适应限流的下限/上限（同时写入配置）
+- GET /api/diagnostics/p115  115 常驻客户端注册表统计、p115client 方法能力表
+- GET /api/diagnostics/strm  STRM 播放重定向的直链缓存统计
+"""
+
+from fastapi import APIRouter, Form
+
+from core.db import set_config
+from core.p115_client import P115Error, get_115_limiter
+from core.p115_pool import p115_pool
+from core.qps_limiter import limiter_stats
+from core.strm_redirect import download_url_cache
+
+router = APIRouter()
+
+@router.get("/diagnostics/limiters")
+def api_diagnostics_limiters():
+    return {"code": 0, "data": limiter_stats()}
+
+@router.post("/diagnostics/limiters/115")
+def api_diagnostics_set_115_bounds(floor: float = Form(...), ceiling: float = Form(...)):
+    if floor <= 0 or ceiling < floor:
+        return {"code": 1, "msg": "需要 0 < floor <= ceiling"}
+    set_config("115_qps_min", str(floor))
+    set_config("115_qps_max", str(ceiling))
+    limiter = get_115_limiter()
+    limiter.set_bounds(floor, ceiling)
+    return {"code": 0, "data": limiter.stats()}
+
+@router.get("/diagnostics/p115")
+def api_diagnostics_p115():
+    """客户端注册表统计 + 初始化时解析出的方法能力表（各操作使用的方法名与调用约定）"""
+    data = {"pool": p115_pool.stats()}
+    try:
+        data["capabilities"] = p115_pool.get().describe_capabilities()
+    except P115Error as e:
+        data["capabilities"] = None
+        data["error"] = str(e)
+    return {"code": 0, "data": data}
+
+@router.get("/diagnostics/strm")
+def api_diagnostics_strm():
+    """直链缓存命中 / 未命中 / 合并的并发请求数、缓存条目数"""
+    return {"code": 0, "data": download_url_cache.get_stats()}
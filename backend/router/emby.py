@@ -25,7 +25,7 @@ def api_emby_refresh_and_probe(item_id: str = Form(None), background: Background
 
     qps = int(get_config("emby_qps", 1))
     limiter = get_limiter("emby", qps)
-    if not limiter.consume():
+    if not limiter.acquire(timeout=10):
         push_log("WARN", "Emby 请求被限流（QPS）")
         return {"code": 429, "msg": "rate limited"}
 
@@ -1,15 +1,20 @@
 import asyncio
+import base64
+import json
 from fastapi import APIRouter, Form, BackgroundTasks, HTTPException, Query
 from typing import Optional, Dict, Any, List
 import time
 import requests
 
-from core.p115_client import P115Wrapper, P115Error
+from core.p115_client import P115Error
+from core.p115_pool import p115_pool
+from core.dir_index import dir_index
+from core.tree_watcher import tree_watcher
 from core.db import get_config, get_secret
 from core.logger import push_log
 from core.qps_limiter import get_limiter
-from core.zid_loader import ZID_CACHE
-from core.organizer import start_organize_job 
+from core.zid_loader import zid_registry
+from core.organizer import start_organize_job, preview_organize_job
 
 router = APIRouter()
 
@@ -22,21 +27,45 @@ def _get_emby_info():
 # 文件列表 API (适配 FileSelector)
 # ----------------------------------------------------------------------
 
+def _encode_cursor(cid: str, offset: int) -> str:
+    raw = json.dumps({"cid": cid, "offset": offset}, separators=(",", ":")).encode("utf8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    data = json.loads(raw)
+    return {"cid": str(data["cid"]), "offset": int(data["offset"])}
+
 # 将 path 视为 115 的 CID
+# 分页：每次只向 115 请求一页，响应带 next_cursor（取完为 null），前端用 cursor= 继续加载
 @router.get("/file/list")
-async def api_file_list(path: str = Query("0"), limit: int = 200): 
-    cookie = get_secret("115_cookie")
-    if not cookie:
+async def api_file_list(path: str = Query("0"), limit: int = Query(200, ge=1, le=1150), cursor: Optional[str] = None,
+                        refresh: bool = False): 
+    offset = 0
+    if cursor:
+        try:
+            c = _decode_cursor(cursor)
+        except Exception:
+            raise HTTPException(status_code=400, detail="无效的 cursor")
+        if c["cid"] != path:
+            raise HTTPException(status_code=400, detail="cursor 与目录不匹配")
+        offset = c["offset"]
+
+    if not p115_pool.cookie():
         # 如果未登录，返回 401
         raise HTTPException(status_code=401, detail="115 Cookie 未设置")
         
     try:
-        p = P115Wrapper(cookie)
-        
         # 定义同步函数，负责调用 p115client 和数据格式化
-        def sync_list_files(cid: str, limit: int) -> List[Dict[str, Any]]:
-            # 假设 p.list_files 接受 CID 并返回原始数据
-            raw_files = p.list_files(cid, limit=limit) 
+        def sync_list_files(cid: str, limit: int):
+            # 假设 p.list_page 接受 CID 并返回原始数据
+            with p115_pool.lease() as p:
+                # refresh=true 时绕过本地目录索引，直接向 115 请求并写回索引
+                if refresh:
+                    dir_index.invalidate(cid)
+                raw_files, total = p.list_page(cid, offset, limit)
+            end = offset + len(raw_files)
+            more = len(raw_files) >= limit and (total is None or end < total)
             
             # **【连通性核心：数据格式化】**
             # 转换为前端 FileSelector 期望的格式：{ id, name, children, date }
@@ -50,13 +79,13 @@ async def api_file_list(path: str = Query("0"), limit: int = 200):
                     "children": is_dir,
                     "date": x.get("te") # 假设 'te' 是日期字段
                 })
-            return formatted_files
+            return formatted_files, (_encode_cursor(cid, end) if more else None), total
 
         # **【异步包装】**：使用 asyncio.to_thread 安全地调用同步函数
-        files = await asyncio.to_thread(sync_list_files, path, limit)
+        files, next_cursor, total = await asyncio.to_thread(sync_list_files, path, limit)
         
-        # 返回适配前端 FileSelector 的格式: { code: 0, data: [...] }
-        return {"code": 0, "data": files} 
+        # 返回适配前端 FileSelector 的格式: { code: 0, data: [...], next_cursor, total }
+        return {"code": 0, "data": files, "next_cursor": next_cursor, "total": total} 
 
     except P115Error as e:
         push_log("ERROR", f"115 client error: {e}")
@@ -65,25 +94,59 @@ async def api_file_list(path: str = Query("0"), limit: int = 200):
         push_log("ERROR", f"list files error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/file/index")
+def api_file_index_stats():
+    """本地目录索引的命中率与规模"""
+    return {"code": 0, "data": dir_index.get_stats()}
+
+@router.post("/file/index/invalidate")
+def api_file_index_invalidate(cid: Optional[str] = Form(None)):
+    """失效指定目录的本地索引；不传 cid 时清空全部"""
+    if cid:
+        dir_index.invalidate(cid)
+    else:
+        dir_index.invalidate()
+    return {"code": 0, "data": dir_index.get_stats()}
+
+@router.get("/file/watcher")
+def api_file_watcher_stats():
+    """目录变更监视器状态：各根目录扫描次数、上一轮新增 / 删除 / 移动数量"""
+    return {"code": 0, "data": tree_watcher.get_stats()}
+
+@router.post("/file/watcher/scan")
+def api_file_watcher_scan():
+    """立即触发一轮增量扫描（后台执行）"""
+    if not get_config("watcher.roots", ""):
+        return {"code": 1, "msg": "未配置 watcher.roots"}
+    tree_watcher.trigger()
+    return {"code": 0, "msg": "scan triggered"}
+
+@router.get("/file/zid")
+def api_file_zid_stats():
+    """当前生效的 zid.yml 规则版本、路径与分类列表"""
+    return {"code": 0, "data": zid_registry.get_stats()}
+
+@router.post("/file/zid/reload")
+def api_file_zid_reload():
+    """立即重新加载 zid.yml（校验失败时保留旧规则并返回错误）"""
+    zid_registry.check(force=True)
+    if zid_registry.last_error:
+        return {"code": 1, "msg": zid_registry.last_error, "data": zid_registry.get_stats()}
+    return {"code": 0, "data": zid_registry.get_stats()}
+
 # ----------------------------------------------------------------------
 # 其他原有 API 保持不变 (move, rename, notify_emby, organize/start)
 # ----------------------------------------------------------------------
 
 @router.post("/file/move")
 def api_file_move(src: str = Form(...), dst: str = Form(...)):
-    cookie = get_secret("115_cookie")
     try:
-        p = P115Wrapper(cookie)
-        for name in ("move","file_move","mv","fs_move"):
-            if hasattr(p.client, name):
-                fn = getattr(p.client, name)
-                try:
-                    r = fn(src, dst)
-                    push_log("INFO", f"移动文件: {src} -> {dst}")
-                    return {"code": 0, "data": r}
-                except Exception:
-                    continue
-        return {"code": 2, "msg": "p115client 未实现移动接口"}
+        with p115_pool.lease() as p:
+            if not p.supports("move"):
+                return {"code": 2, "msg": "p115client 未实现移动接口"}
+            r = p.move(src, dst)
+        push_log("INFO", f"移动文件: {src} -> {dst}")
+        return {"code": 0, "data": r}
     except Exception as e:
         push_log("ERROR", f"move error: {e}")
         return {"code": 3, "msg": str(e)}
@@ -103,7 +166,7 @@ def api_notify_emby(path: str = Form(...), background: BackgroundTasks = None):
     try:
         qps = int(get_config("emby_qps", 1))
         limiter = get_limiter("emby", qps)
-        if not limiter.consume():
+        if not limiter.acquire(timeout=10):
             return {"code": 429, "msg": "emby rate limited"}
 
         def do_refresh():
@@ -139,4 +202,12 @@ async def api_organize_start():
             
     except Exception as e:
         push_log("ERROR", f"启动整理任务时发生错误: {e}")
-        return {"code": 500, "msg": f"服务器内部错误: {e}"}
\ No newline at end of file
+        return {"code": 500, "msg": f"服务器内部错误: {e}"}
+
+@router.post("/file/organize/preview")
+async def api_organize_preview():
+    """整理预演：返回剧集分组（同一季只识别一次）与各分类的文件数，不移动文件"""
+    result = await preview_organize_job()
+    if result is None:
+        return {"code": 1, "msg": "整理预演失败或配置未启用"}
+    return {"code": 0, "data": result}
@@ -0,0 +1,23 @@
+# backend/router/strm.py
+"""
+STRM 播放重定向（不带 /api 前缀，STRM 文件直接指向这里）
+- GET /strm/115/{pickcode}  解析 115 下载直链（按 User-Agent 缓存）并 302 跳转
+"""
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+
+from core.logger import push_log
+from core.strm_redirect import download_url_cache
+
+router = APIRouter()
+
+@router.get("/strm/115/{pickcode}")
+async def strm_115_redirect(pickcode: str, request: Request):
+    user_agent = request.headers.get("user-agent", "")
+    try:
+        url = await download_url_cache.resolve(pickcode, user_agent)
+    except Exception as e:
+        push_log("ERROR", f"STRM 直链解析失败 ({pickcode}): {e}")
+        return JSONResponse({"code": 1, "msg": str(e)}, status_code=502)
+    return RedirectResponse(url, status_code=302)
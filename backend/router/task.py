@@ -0,0 +1,77 @@
+# backend/router/task.py
+"""
+通用任务队列查询路由
+- GET /api/task/status?task_id=...  查询单个任务（含日志）
+- GET /api/task/list?status=&limit=&offset=  按创建时间倒序列出历史任务
+- GET /api/task/stats  线程池队列深度与各优先级并发情况
+- GET /api/task/events?task_id=&cursor=  SSE 推送任务状态、进度与日志（支持 Last-Event-ID 续传）
+"""
+
+import asyncio
+import json
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from core import event_bus
+from task_queue import get_task, list_tasks, get_queue_stats
+
+router = APIRouter()
+
+@router.get("/task/status")
+def api_task_status(task_id: str, log_limit: Optional[int] = None):
+    t = get_task(task_id, log_limit=log_limit)
+    if not t:
+        return {"code": 1, "msg": "not found"}
+    return {"code": 0, "data": t}
+
+@router.get("/task/list")
+def api_task_list(status: Optional[str] = None, limit: int = 100, offset: int = 0):
+    limit = max(1, min(limit, 1000))
+    return {"code": 0, "data": list_tasks(status=status, limit=limit, offset=max(0, offset))}
+
+@router.get("/task/stats")
+def api_task_stats():
+    return {"code": 0, "data": {**get_queue_stats(), "events": event_bus.stats()}}
+
+_KEEPALIVE_SECONDS = 15
+
+def _format_sse(event) -> str:
+    data = json.dumps({"ts": event["ts"], **event["data"]}, ensure_ascii=False)
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+@router.get("/task/events")
+async def api_task_events(request: Request, task_id: Optional[str] = None, cursor: int = 0):
+    """
+    SSE 事件流：event 为 task / progress / log，id 为事件 seq。
+    断线重连时浏览器会带上 Last-Event-ID，从该位置之后继续推送。
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+
+    async def stream():
+        # 先订阅再回放，保证两者之间发布的事件不会丢失（按 seq 去重）
+        sub = event_bus.subscribe(task_id)
+        last = cursor
+        try:
+            for event in event_bus.replay(last, task_id):
+                yield _format_sse(event)
+                last = event["seq"]
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event["seq"] <= last:
+                    continue
+                yield _format_sse(event)
+                last = event["seq"]
+        finally:
+            event_bus.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Form
 from core.tmdb_client import search_movie_by_name, search_tv_by_name, get_movie_details, get_tv_details, ai_assist_identify
 from core.logger import push_log
+from core.tmdb_cache import tmdb_cache
 
 router = APIRouter()
 
@@ -42,3 +43,15 @@ def api_tmdb_identify(name: str = Form(...), typ: str = Form("movie")):
     except Exception as e:
         push_log("ERROR", f"TMDB identify 错误: {e}")
         return {"code": 1, "msg": str(e)}
+
+@router.get("/tmdb/cache")
+def api_tmdb_cache_stats():
+    """TMDB 缓存命中率与条目数"""
+    return {"code": 0, "data": tmdb_cache.get_stats()}
+
+@router.post("/tmdb/cache/purge")
+def api_tmdb_cache_purge(endpoint: str = Form(None), expired_only: bool = Form(False)):
+    """清除 TMDB 缓存；endpoint 如 search/movie、tv，不传则清除全部"""
+    n = tmdb_cache.purge(endpoint, expired_only)
+    push_log("INFO", f"已清除 {n} 条 TMDB 缓存")
+    return {"code": 0, "data": {"purged": n, **tmdb_cache.get_stats()}}
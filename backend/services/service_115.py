@@ -4,14 +4,14 @@
 # from p115client import P115Client
 # class Drive115Service: ...
 
-    def get_file_list(self, cid: str = "0") -> List[Dict[str, Any]]:
+    def get_file_list(self, cid: str = "0", offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """
-        同步方法：调用 p115client 获取文件列表，并格式化数据。
+        同步方法：调用 p115client 获取文件列表的一页（offset 起最多 limit 条），并格式化数据。
         """
         if not self.client: return []
         try:
             # 假设 p115client 的接口
-            resp = self.client.fs_files(cid=cid, limit=100)
+            resp = self.client.fs_files(cid=cid, offset=offset, limit=limit)
             if resp.get("state"):
                 # **【连通点：数据格式化，适配前端 FileSelector】**
                 return [{
@@ -24,4 +24,16 @@
             logger.error(f"115 List Error: {e}")
         return []
 
+    def iter_file_list(self, cid: str = "0", page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        按 offset 逐页遍历整个目录直到取完（不会截断超过一页的大目录）。
+        """
+        offset = 0
+        while True:
+            page = self.get_file_list(cid, offset=offset, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += len(page)
+
 # drive_115 = Drive115Service()
\ No newline at end of file
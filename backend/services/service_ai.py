@@ -1,15 +1,61 @@
+import asyncio
 import logging
 import json
-from typing import Optional, Dict, Any
+import re
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List
 from openai import AsyncOpenAI
+from core.db import open_store
 
 logger = logging.getLogger("AIService")
 
+# 解析结果缓存：按完整文件名，以及去掉发布组/标签后的"模式"各存一份
+# 键带版本号（规范化规则变化时递增，旧条目自动失效），条目超过 organize.ai.cacheTtl 秒（默认 30 天）后不再使用
+AI_CACHE_DB = Path(__file__).resolve().parent.parent / "ai_cache.db"
+AI_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ai_parse_cache (
+  key TEXT PRIMARY KEY,
+  result TEXT NOT NULL,
+  created_at REAL NOT NULL
+);
+"""
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_CONCURRENCY = 2
+DEFAULT_CACHE_TTL = 30 * 86400
+CACHE_VERSION = 2
+
+_EXT_RE = re.compile(r"\.[A-Za-z0-9]{2,4}$")
+_BRACKET_RE = re.compile(r"\[[^\]]*\]|【[^】]*】")
+# 只去掉紧跟在画质 / 编码 / 片源等标记后面的 -发布组，"X-Men"、"Spider-Man" 这类标题中的连字符保持不变
+_GROUP_SUFFIX_RE = re.compile(
+    r"(?i)(?<![A-Za-z0-9])((?:\d{3,4}p|[48]k|uhd|x26[45]|h\.?26[45]|hevc|avc|av1|xvid|divx|10bit|8bit|hdr10?|dv"
+    r"|web-?dl|web-?rip|web|blu-?ray|bdrip|brrip|bd|hdtv|hdrip|dvdrip|dvd|remux"
+    r"|aac(?:2\.0)?|ac3|e?ac-?3|dts(?:-?hd)?|ddp?\d?(?:\.\d)?|flac|truehd|atmos))-[A-Za-z0-9]+$"
+)
+_SEP_RE = re.compile(r"[\s._]+")
+
+def release_pattern(filename: str) -> str:
+    """
+    去掉扩展名、方括号标签（[字幕组]、[1080p] 等）和画质 / 编码标记后的 -发布组 后的规范化名称，
+    同一资源不同发布组的文件得到相同的模式。
+    """
+    name = _EXT_RE.sub("", filename)
+    name = _BRACKET_RE.sub(" ", name)
+    name = _GROUP_SUFFIX_RE.sub(r"\1", name.strip())
+    return _SEP_RE.sub(" ", name).strip().lower()
+
 class AIService:
     def __init__(self):
         self.client: Optional[AsyncOpenAI] = None
         self.model: str = "gpt-3.5-turbo"
         self.enabled: bool = False
+        self.batch_size: int = DEFAULT_BATCH_SIZE
+        self.concurrency: int = DEFAULT_CONCURRENCY
+        self.cache_ttl: float = DEFAULT_CACHE_TTL
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.stats = {"requests": 0, "cache_hits": 0, "pattern_hits": 0, "parsed": 0, "failed": 0}
 
     def init_config(self, app_config: Dict[str, Any]):
         ai_conf = app_config.get("organize", {}).get("ai", {})
@@ -20,25 +66,121 @@ class AIService:
                 base_url=ai_conf.get("baseUrl", "https://api.openai.com/v1")
             )
             self.model = ai_conf.get("model", "gpt-3.5-turbo")
+        self.batch_size = self._int(ai_conf.get("batchSize"), DEFAULT_BATCH_SIZE)
+        self.concurrency = self._int(ai_conf.get("concurrency"), DEFAULT_CONCURRENCY)
+        self.cache_ttl = self._int(ai_conf.get("cacheTtl"), DEFAULT_CACHE_TTL)
+        self._sem = None
+
+    @staticmethod
+    def _int(value, default: int) -> int:
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return default
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def _conn(self):
+        return open_store(AI_CACHE_DB, AI_CACHE_SCHEMA)
+
+    @staticmethod
+    def _key(kind: str, value: str) -> str:
+        return f"v{CACHE_VERSION}:{kind}:{value}"
+
+    def _cache_get(self, filename: str) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        sql = "SELECT result FROM ai_parse_cache WHERE key=? AND created_at>?"
+        since = time.time() - self.cache_ttl
+        row = conn.execute(sql, (self._key("name", filename), since)).fetchone()
+        if row:
+            self.stats["cache_hits"] += 1
+            return json.loads(row[0])
+        row = conn.execute(sql, (self._key("pattern", release_pattern(filename)), since)).fetchone()
+        if row:
+            self.stats["pattern_hits"] += 1
+            return json.loads(row[0])
+        return None
+
+    def _cache_put(self, results: Dict[str, Dict[str, Any]]):
+        now = time.time()
+        rows = []
+        for filename, result in results.items():
+            data = json.dumps(result, ensure_ascii=False)
+            rows.append((self._key("name", filename), data, now))
+            rows.append((self._key("pattern", release_pattern(filename)), data, now))
+        conn = self._conn()
+        conn.executemany("REPLACE INTO ai_parse_cache(key,result,created_at) VALUES(?,?,?)", rows)
+        conn.commit()
+
+    # ------------------------------------------------------------------
+    # 解析
+    # ------------------------------------------------------------------
 
     async def parse_filename(self, filename: str) -> Optional[Dict[str, Any]]:
-        if not self.enabled or not self.client: return None
+        return (await self.parse_filenames([filename])).get(filename)
+
+    async def parse_filenames(self, filenames: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批量解析：先查缓存，未命中的文件名按 batch_size 打包成一次请求，
+        同时进行的请求数不超过 concurrency。返回 {文件名: 解析结果或 None}
+        """
+        if not self.enabled or not self.client: return {}
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        misses = []
+        for name in dict.fromkeys(filenames):
+            cached = self._cache_get(name)
+            if cached is not None:
+                results[name] = cached
+            else:
+                misses.append(name)
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        batches = [misses[i:i + self.batch_size] for i in range(0, len(misses), self.batch_size)]
+        for parsed in await asyncio.gather(*(self._parse_batch(b) for b in batches)):
+            results.update(parsed)
+        return results
+
+    async def _parse_batch(self, filenames: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        listing = "\n".join(f"{i}. {name}" for i, name in enumerate(filenames))
         prompt = f"""
-        请分析文件名: "{filename}"。
-        返回纯JSON: {{"title": "标题", "year": "年份", "season": 季号(int), "episode": 集号(int)}}
-        无法识别设为null。
+        请逐个分析以下文件名（每行以序号开头）:
+        {listing}
+        返回纯JSON数组，每个文件一项，按序号顺序:
+        [{{"index": 序号, "title": "标题", "year": "年份", "season": 季号(int), "episode": 集号(int)}}]
+        无法识别的字段设为null。
         """
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1
-            )
-            content = response.choices[0].message.content.strip()
-            if content.startswith("```json"): content = content[7:-3]
-            return json.loads(content)
-        except Exception as e:
-            logger.error(f"AI Error: {e}")
-            return None
+        async with self._sem:
+            self.stats["requests"] += 1
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.1
+                )
+                content = response.choices[0].message.content.strip()
+                if content.startswith("```json"): content = content[7:-3]
+                elif content.startswith("```"): content = content[3:-3]
+                items = json.loads(content)
+                if isinstance(items, dict): items = [items]
+            except Exception as e:
+                logger.error(f"AI Error: {e}")
+                self.stats["failed"] += len(filenames)
+                return {name: None for name in filenames}
+        parsed: Dict[str, Dict[str, Any]] = {}
+        for pos, item in enumerate(items):
+            if not isinstance(item, dict): continue
+            try:
+                idx = int(item.pop("index", pos))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < len(filenames):
+                parsed[filenames[idx]] = item
+        self.stats["parsed"] += len(parsed)
+        self.stats["failed"] += len(filenames) - len(parsed)
+        if parsed:
+            self._cache_put(parsed)
+        return {name: parsed.get(name) for name in filenames}
 
 ai_service = AIService()
@@ -1,25 +1,62 @@
 import os
-import yaml
+import asyncio
 import re
 import logging
 import httpx
-from typing import Dict, Any
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
 from tmdbv3api import TMDb, Movie, TV, Search
 from backend.services.service_115 import drive_115
 from backend.services.service_ai import ai_service
+from core.p115_client import is_error
+from core.p115_pool import p115_pool
+from core.qps_limiter import get_limiter
+from core.tmdb_cache import tmdb_cache
+from core.zid_loader import zid_registry
+from organizer import group_by_series, group_label
 
 logger = logging.getLogger("Organizer")
 
+# 单次 fs_move 携带的文件 id 上限
+MOVE_BATCH_SIZE = 500
+# 识别阶段默认并发数 / TMDB 默认速率（TMDB 官方上限约 50 请求每秒）
+DEFAULT_IDENTIFY_CONCURRENCY = 8
+DEFAULT_TMDB_QPS = 20
+
+def _error_text(res: Any) -> str:
+    """115 失败响应中的错误信息"""
+    if isinstance(res, dict):
+        return str(res.get("error") or res.get("msg") or res.get("message") or f"errno={res.get('errno')}")
+    return repr(res)
+
+class CachedInfo(dict):
+    """缓存中取出的 TMDB 详情：支持与 tmdbv3api 对象相同的属性访问（info.genres 等）"""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+def _info_to_dict(info) -> Optional[Dict[str, Any]]:
+    data = getattr(info, "_json", None)
+    if isinstance(data, dict):
+        return data
+    try:
+        return dict(info)
+    except (TypeError, ValueError):
+        return None
+
 class MediaOrganizer:
     def __init__(self):
         self.tmdb = TMDb()
         self.tmdb_search = Search()
         self.tmdb_movie = Movie()
         self.tmdb_tv = TV()
-        self.rules = {}
         self.organize_conf = {}
         self.emby_conf = {}
-        self.load_rules()
+        # (父目录 cid, 目录名) -> cid，避免重复 fs_mkdir
+        self._folder_cache: Dict[Tuple[str, str], str] = {}
+        self._listed_parents = set()
 
     def init_config(self, app_config: Dict[str, Any]):
         tmdb_conf = app_config.get("tmdb", {})
@@ -29,10 +66,9 @@ class MediaOrganizer:
         self.emby_conf = app_config.get("emby", {})
         ai_service.init_config(app_config)
 
-    def load_rules(self):
-        path = "zid.yml"
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f: self.rules = yaml.safe_load(f)
+    @property
+    def rules(self) -> Dict[str, Any]:
+        return zid_registry.current().raw
 
     def parse_filename(self, filename: str):
         name = os.path.splitext(filename)[0]
@@ -41,79 +77,183 @@ class MediaOrganizer:
         clean_name = re.split(r'[\(\.]1080|[\(\.]2160', name, flags=re.IGNORECASE)[0].replace(".", " ").strip()
         return clean_name, year
 
-    def get_tmdb_info(self, keyword, year, is_movie=True):
+    def get_tmdb_info(self, keyword, year, is_movie=True, limiter=None):
+        """
+        同步查询（搜索 + 详情），结果经 tmdb_cache 缓存（无结果也缓存，避免反复查询）；
+        传入 limiter 时每个 TMDB 请求前排队取令牌
+        """
         if not self.tmdb.api_key: return None
+        endpoint = "organizer/movie" if is_movie else "organizer/tv"
+        hit, cached = tmdb_cache.lookup(endpoint, keyword, year, self.tmdb.language)
+        if hit:
+            return CachedInfo(cached) if cached else None
         try:
+            if limiter: limiter.acquire()
             res = self.tmdb_search.movies(term=keyword, year=year) if is_movie else self.tmdb_search.tv_shows(term=keyword, first_air_date_year=year)
+            info = None
             if res:
                 media_id = res[0].id
-                return self.tmdb_movie.details(media_id) if is_movie else self.tmdb_tv.details(media_id)
+                if limiter: limiter.acquire()
+                info = self.tmdb_movie.details(media_id) if is_movie else self.tmdb_tv.details(media_id)
+            data = _info_to_dict(info) if info else {}
+            if data is not None:
+                tmdb_cache.store(endpoint, keyword, year, self.tmdb.language, data)
+            return info
         except Exception as e: logger.warning(f"TMDB Error: {e}")
         return None
 
-    def match_category(self, info, media_type='movie'):
-        if media_type not in self.rules: return "未分类"
-        for cat, conds in self.rules[media_type].items():
-            if not conds: continue
-            match = True
-            
-            # Genre
-            if 'genre_ids' in conds:
-                target = str(conds['genre_ids']).split(',')
-                info_genres = [str(g['id']) for g in getattr(info, 'genres', [])]
-                if not any(t in info_genres for t in target): match = False
-            
-            # Country
-            if match and ('origin_country' in conds or 'production_countries' in conds):
-                target = conds.get('origin_country', conds.get('production_countries')).split(',')
-                info_c = getattr(info, 'origin_country', [])
-                if not info_c and hasattr(info, 'production_countries'):
-                    info_c = [c['iso_3166_1'] for c in info.production_countries]
-                
-                exclude = any(t.startswith('!') for t in target)
-                cleant = [t.replace('!', '') for t in target]
-                has_inter = any(c in cleant for c in info_c)
-                if exclude and has_inter: match = False
-                if not exclude and not has_inter: match = False
-            
-            if match: return cat
-        return "未分类"
-
-    async def run_organize(self):
-        if not self.organize_conf.get("enabled"): return
-        src_cid = self.organize_conf.get("sourceCid", "0")
-        tgt_cid = self.organize_conf.get("targetCid", "0")
-        
-        files = drive_115.get_file_list(src_cid)
-        for file in files:
-            if file['children']: continue
-            filename = file['name']
-            
+    def _int_conf(self, key: str, default: int) -> int:
+        try:
+            return max(1, int(self.organize_conf.get(key, default)))
+        except (TypeError, ValueError):
+            return default
+
+    async def identify(self, file: Dict[str, Any], sem: asyncio.Semaphore, limiter,
+                       parsed: Optional[Dict[str, Any]] = None, rules=None) -> Optional[str]:
+        """
+        识别单个文件并返回分类；parsed 为批量 AI 解析的结果，TMDB 同步调用放到线程中执行。
+        rules 为本次整理开始时取得的 zid 规则快照，未传时使用当前版本
+        """
+        rules = rules or zid_registry.current()
+        filename = file['name']
+        async with sem:
             # AI 优先
-            parsed = await ai_service.parse_filename(filename)
             if parsed and parsed.get("title"):
                 kw, yr = parsed['title'], parsed.get('year')
                 is_tv = parsed.get('season') is not None
             else:
                 kw, yr = self.parse_filename(filename)
                 is_tv = bool(re.search(r'S\d+E\d+', filename, re.IGNORECASE))
-            
-            info = self.get_tmdb_info(kw, yr, not is_tv)
-            if not info: continue
-            
-            cat = self.match_category(info, 'tv' if is_tv else 'movie')
-            logger.info(f"Matched {filename} -> {cat}")
-            
-            # 移动文件逻辑
-            try:
-                # 1. 确保目录
-                res = drive_115.client.fs_mkdir(name=cat, pid=tgt_cid)
-                real_tgt = res.get('id') or res.get('cid')
-                # 2. 移动
-                drive_115.client.fs_move(file['id'], pid=real_tgt)
-                logger.info(f"✅ Moved: {filename}")
-            except Exception as e:
-                logger.error(f"Move Error: {e}")
+
+            info = await asyncio.to_thread(self.get_tmdb_info, kw, yr, not is_tv, limiter)
+        if not info: return None
+
+        cat = self.match_category(info, 'tv' if is_tv else 'movie', rules)
+        logger.info(f"Matched {filename} -> {cat} (rules v{rules.version})")
+        return cat
+
+    def match_category(self, info, media_type='movie', rules=None):
+        return (rules or zid_registry.current()).compiled.classify_one(info, media_type)
+
+    def ensure_folder(self, name: str, pid: str, p115=None) -> Optional[str]:
+        """
+        返回 pid 下名为 name 的目录 cid：先查缓存，再按需列一次父目录，最后才新建目录。
+        新建经 P115Wrapper.mkdir（共享限流器、失效父目录索引）
+        """
+        key = (str(pid), name)
+        if key in self._folder_cache:
+            return self._folder_cache[key]
+        if key[0] not in self._listed_parents:
+            self._listed_parents.add(key[0])
+            for x in drive_115.iter_file_list(key[0]):
+                if x['children']:
+                    self._folder_cache[(key[0], x['name'])] = x['id']
+            if key in self._folder_cache:
+                return self._folder_cache[key]
+        res = (p115 or p115_pool.get()).mkdir(name, str(pid))
+        if is_error(res):
+            logger.error(f"Mkdir Error ({name}): {_error_text(res)}")
+            return None
+        # p115client 返回响应字典，其它客户端的 mkdir 可能直接返回 cid
+        cid = (res.get('id') or res.get('cid') or res.get('file_id')) if isinstance(res, dict) else res
+        if cid:
+            self._folder_cache[key] = str(cid)
+        return cid
+
+    def move_grouped(self, plan: Dict[str, List[str]], tgt_cid: str) -> Dict[str, int]:
+        """
+        按目标分类分组：每个分类目录只确保一次，再按 MOVE_BATCH_SIZE 批量移动。
+        建目录与移动都经 P115Wrapper：与其他 115 调用共用限流器，并失效源目录 / 目标目录的目录索引
+        """
+        stats = {"folders": 0, "move_calls": 0, "moved": 0, "failed": 0}
+        with p115_pool.lease() as p115:
+            for cat, file_ids in plan.items():
+                try:
+                    real_tgt = self.ensure_folder(cat, tgt_cid, p115)
+                except Exception as e:
+                    logger.error(f"Mkdir Error ({cat}): {e}")
+                    stats["failed"] += len(file_ids)
+                    continue
+                if not real_tgt:
+                    stats["failed"] += len(file_ids)
+                    continue
+                stats["folders"] += 1
+                for i in range(0, len(file_ids), MOVE_BATCH_SIZE):
+                    batch = file_ids[i:i + MOVE_BATCH_SIZE]
+                    try:
+                        res = p115.move(batch, real_tgt)
+                    except Exception as e:
+                        error = str(e)
+                    else:
+                        # 115 拒绝时不抛异常，而是返回 state=False / errno 非 0
+                        error = _error_text(res) if is_error(res) else None
+                    stats["move_calls"] += 1
+                    if error is not None:
+                        stats["failed"] += len(batch)
+                        logger.error(f"Move Error ({cat}, {len(batch)} files): {error}")
+                        continue
+                    stats["moved"] += len(batch)
+                    logger.info(f"✅ Moved {len(batch)} files -> {cat}")
+        return stats
+
+    async def run_organize(self, dry_run: bool = False):
+        """dry_run=True 时只识别并返回分组与分类计划，不创建目录、不移动文件"""
+        if not self.organize_conf.get("enabled"): return
+        src_cid = self.organize_conf.get("sourceCid", "0")
+        tgt_cid = self.organize_conf.get("targetCid", "0")
+        
+        # 目录缓存只在本次整理内有效（网盘上的目录可能被手动删改）
+        self._folder_cache.clear()
+        self._listed_parents.clear()
+
+        # 列目录是同步网络调用，放到线程中避免阻塞事件循环
+        files = await asyncio.to_thread(
+            lambda: [f for f in drive_115.iter_file_list(src_cid) if not f['children']]
+        )
+
+        # 1. 同一剧集同一季的文件归为一组，每组只用第一个文件识别一次
+        groups = group_by_series(files, lambda f: f['name'])
+
+        # 2. 并发识别各组（并发数 organize.concurrency，TMDB 请求经 organize.tmdbQps 限流），
+        #    结果应用到组内全部文件，生成 分类 -> 文件 id 列表 的计划
+        # 整个批次使用同一版本的规则，期间 zid.yml 热更新不影响本次结果
+        rules = zid_registry.current()
+        sem = asyncio.Semaphore(self._int_conf("concurrency", DEFAULT_IDENTIFY_CONCURRENCY))
+        limiter = get_limiter("tmdb", self._int_conf("tmdbQps", DEFAULT_TMDB_QPS))
+        # AI 解析批量进行（多个文件名一次请求，带缓存），未启用 AI 时为空
+        parsed = await ai_service.parse_filenames([members[0]['name'] for _, members in groups])
+        cats = await asyncio.gather(
+            *(self.identify(members[0], sem, limiter, parsed.get(members[0]['name']), rules) for _, members in groups),
+            return_exceptions=True,
+        )
+        plan: Dict[str, List[str]] = defaultdict(list)
+        preview = []
+        for (key, members), cat in zip(groups, cats):
+            if isinstance(cat, Exception):
+                logger.error(f"Identify Error ({members[0]['name']}): {cat}")
+                cat = None
+            if cat:
+                plan[cat].extend(f['id'] for f in members)
+            preview.append({
+                "group": group_label(key),
+                "category": cat,
+                "files": [f['name'] for f in members],
+                "rules_version": rules.version,
+            })
+        logger.info(f"Identified {sum(len(v) for v in plan.values())}/{len(files)} files in {len(groups)} groups")
+        if dry_run:
+            return {
+                "groups": preview,
+                "plan": {cat: len(ids) for cat, ids in plan.items()},
+                "rules_version": rules.version,
+            }
+
+        # 3. 每个分类目录创建一次，再按目录批量移动
+        stats = await asyncio.to_thread(self.move_grouped, plan, tgt_cid)
+        logger.info(
+            f"Organize done: {stats['moved']} moved / {stats['failed']} failed, "
+            f"{stats['folders']} folders, {stats['move_calls']} move calls, rules v{rules.version}"
+        )
 
         # 刷新 Emby
         if self.emby_conf.get("refreshAfterOrganize"):
@@ -1,31 +1,239 @@
 import os
+import shutil
 import logging
 import aiofiles
 import asyncio
+import time
 from functools import partial
+from typing import Tuple
 # 修正导入路径：从同一个 services 目录导入所有服务模块
 from .service_115 import drive_115 
 from .service_openlist import drive_openlist 
 from .service_123 import drive_123 # <--- 假设 123 云盘服务存在
+from core.async_iter import iterate_in_thread
+from core.strm_filter import StrmFilter, COMPANION, SKIP, item_size
+from core.strm_manifest import StrmManifest, settings_fingerprint
+from core.strm_redirect import redirect_url
+from core.p115_client import get_115_limiter, is_throttle
 
 logger = logging.getLogger("STRM")
 
+# 下载地址解析并发数 / 段间队列长度 / 每批写盘的文件数
+DEFAULT_RESOLVE_CONCURRENCY = 4
+DEFAULT_QUEUE_SIZE = 1000
+WRITE_BATCH_SIZE = 200
+
+def _place_companion(src: str, dst: str, mode: str):
+    """伴随文件（字幕 / NFO）：symlink 模式创建指向挂载目录的软链接，copy 模式复制文件"""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == "symlink":
+        os.symlink(src, dst)
+    else:
+        shutil.copyfile(src, dst)
+
 class StrmGenerator:
     """
     负责执行 115、123 和 OpenList 的目录遍历，生成 .strm 文件。
     """
     def __init__(self):
         self.config = {}
+        # 每个来源最近一次运行的统计（各段计数与吞吐）
+        self.last_run = {}
 
     def init_config(self, app_config):
         """初始化配置，通常从 ConfigManager 中加载。"""
         self.config = app_config.get("strm", {})
 
+    @staticmethod
+    def _item_mtime(item):
+        """遍历结果中的修改时间（不同客户端字段名不同），没有时返回 None"""
+        for key in ("mtime", "te", "t", "modified", "updated_at"):
+            if item.get(key) is not None:
+                return item[key]
+        return None
+
+    async def _write_strm(self, manifest: StrmManifest, file_id, rel_path: str, content: str, mtime=None):
+        """内容与清单记录相同时不写盘，否则写出 .strm 并登记"""
+        if manifest.same_content(file_id, rel_path, content, mtime):
+            return
+        save_path = manifest.abs_path(rel_path)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        async with aiofiles.open(save_path, 'w', encoding='utf-8') as f:
+            await f.write(content)
+        manifest.record(file_id, rel_path, content, mtime)
+
+    def _int_conf(self, key: str, default: int) -> int:
+        try:
+            return max(1, int(self.config.get(key, default)))
+        except (TypeError, ValueError):
+            return default
+
+    async def _run_pipeline(self, source: str, walker, resolve, prefix: str, limiter=None, link=None, settings=None):
+        """
+        遍历 → 解析下载地址 → 写盘 三段流水线，段间用有界队列衔接：
+        - walker: 阻塞的目录遍历（经 iterate_in_thread 在独立线程中拉取），产出带 fid / path 的条目
+        - resolve: 阻塞的 fid -> 下载地址 调用，strm.concurrency 个协程并发，经 limiter 限流
+        - link: 可选，item -> STRM 内容；返回非空时直接写盘，不经过解析段（播放时再解析的重定向地址）
+        - settings: prefix 以外决定 STRM 内容的配置（如 redirectBase），与 prefix 一起作为清单的配置指纹，
+          变化后所有文件重新生成内容
+        - 写盘段按批在线程中写出，同一批内每个目录只创建一次
+        遍历段先按 StrmFilter 过滤（扩展名 / 大小 / 正则），被过滤的文件不产生任何请求；
+        字幕 / NFO 等伴随文件由写盘段从本地挂载目录复制或软链接
+        """
+        out_dir = self.config.get("outputDir", "/data/strm")
+        concurrency = self._int_conf("concurrency", DEFAULT_RESOLVE_CONCURRENCY)
+        queue_size = self._int_conf("queueSize", DEFAULT_QUEUE_SIZE)
+        manifest = StrmManifest(out_dir, source, settings_fingerprint({"prefix": prefix, **(settings or {})}))
+        strm_filter = StrmFilter(self.config)
+        to_resolve: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        to_write: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        counters = {"walked": 0, "unchanged": 0, "companions": 0, "linked": 0, "resolved": 0, "resolve_failed": 0, "limiter_timeout": 0, "written": 0, "identical": 0, "companion_failed": 0}
+        stage_time = {"walk": 0.0, "resolve": 0.0, "write": 0.0}
+        started = time.monotonic()
+
+        async def walk():
+            # fs_walk 可能是惰性生成器，翻页请求必须在工作线程里执行，不能在事件循环中迭代
+            async for item in iterate_in_thread(walker, name=f"strm-walk-{source}"):
+                if "fid" not in item or item.get("path") is None: continue
+                counters["walked"] += 1
+                file_id = item["fid"]
+                kind, _ = strm_filter.check(item["path"], item_size(item))
+                if kind == SKIP: continue
+                mtime = self._item_mtime(item)
+                if kind == COMPANION:
+                    # 不产生请求；写盘段按 放置方式 + 来源 比对清单，未变化时不会重复放置
+                    rel_path = os.path.join(source, item['path'].lstrip('/'))
+                    counters["companions"] += 1
+                    await to_write.put((file_id, rel_path, None, mtime, strm_filter.companion_source(item["path"])))
+                    continue
+                rel_path = os.path.join(source, f"{item['path'].lstrip('/')}.strm")
+                # 源文件没有变化：不解析下载地址，也不写盘
+                if manifest.is_current(file_id, rel_path, mtime):
+                    counters["unchanged"] += 1
+                    continue
+                content = link(item) if link else None
+                if content:
+                    counters["linked"] += 1
+                    await to_write.put((file_id, rel_path, content, mtime, None))
+                    continue
+                await to_resolve.put((file_id, rel_path, mtime))
+            stage_time["walk"] = time.monotonic() - started
+
+        async def resolver():
+            while True:
+                job = await to_resolve.get()
+                if job is None: return
+                file_id, rel_path, mtime = job
+                if limiter is not None and not await limiter.acquire_async():
+                    # 等待令牌超时：按解析失败处理，保留旧的 .strm
+                    logger.warning(f"{source} 等待限流令牌超时，跳过 ({rel_path})")
+                    counters["limiter_timeout"] += 1
+                    manifest.keep(file_id)
+                    continue
+                try:
+                    url = await asyncio.to_thread(resolve, file_id)
+                    if hasattr(limiter, "on_success"): limiter.on_success()
+                except Exception as e:
+                    if hasattr(limiter, "on_throttle") and is_throttle(e): limiter.on_throttle()
+                    logger.warning(f"{source} 下载地址解析失败 ({rel_path}): {e}")
+                    counters["resolve_failed"] += 1
+                    # 保留旧的 .strm，不当作孤立文件清理
+                    manifest.keep(file_id)
+                    continue
+                counters["resolved"] += 1
+                await to_write.put((file_id, rel_path, f"{prefix}{url}", mtime, None))
+
+        async def writer():
+            batch = []
+            while True:
+                job = await to_write.get()
+                if job is not None:
+                    batch.append(job)
+                if batch and (job is None or len(batch) >= WRITE_BATCH_SIZE or to_write.empty()):
+                    written, failed = await asyncio.to_thread(self._write_batch, manifest, batch, strm_filter.companion_mode)
+                    counters["written"] += written
+                    counters["companion_failed"] += failed
+                    counters["identical"] += len(batch) - written - failed
+                    batch = []
+                if job is None: return
+
+        async def produce():
+            await walk()
+            for _ in resolvers:
+                await to_resolve.put(None)
+            await asyncio.gather(*resolvers)
+            stage_time["resolve"] = time.monotonic() - started
+            await to_write.put(None)
+
+        resolvers = [asyncio.create_task(resolver()) for _ in range(concurrency)]
+        tasks = [asyncio.create_task(produce()), asyncio.create_task(writer())]
+        complete = False
+        try:
+            # 任一段出错立即结束（写盘失败时不会让前面的段卡在已满的队列上）
+            await asyncio.gather(*tasks)
+            stage_time["write"] = time.monotonic() - started
+            complete = True
+        finally:
+            for task in resolvers + tasks:
+                task.cancel()
+            manifest_stats = manifest.finish(complete)
+            elapsed = time.monotonic() - started
+            self.last_run[source] = {
+                **counters,
+                "removed": manifest_stats["removed"],
+                # 各过滤规则跳过的文件数
+                "skipped": dict(strm_filter.skipped),
+                "complete": complete,
+                "concurrency": concurrency,
+                "elapsed": round(elapsed, 2),
+                # 各段吞吐（条/秒）：按该段从开始到结束的时间计算
+                "throughput": {
+                    "walk": round(counters["walked"] / stage_time["walk"], 1) if stage_time["walk"] else None,
+                    "resolve": round(counters["resolved"] / stage_time["resolve"], 1) if stage_time["resolve"] else None,
+                    "write": round(counters["written"] / stage_time["write"], 1) if stage_time["write"] else None,
+                },
+            }
+            logger.info(f"{source} STRM run: {self.last_run[source]}")
+        return self.last_run[source]
+
+    @staticmethod
+    def _write_batch(manifest: StrmManifest, batch, companion_mode: str = "off") -> Tuple[int, int]:
+        """
+        写出一批 .strm / 伴随文件（在线程中执行），返回 (实际写盘的文件数, 放置失败的伴随文件数)。
+        job 为 (file_id, rel_path, content, mtime, companion_src)，companion_src 非空时是伴随文件
+        """
+        pending = []
+        for file_id, rel_path, content, mtime, src in batch:
+            if src is not None:
+                # 清单中记录放置方式、来源与修改时间，任一变化时重新放置
+                content = f"{companion_mode}:{src}:{mtime}"
+            if not manifest.same_content(file_id, rel_path, content, mtime):
+                pending.append((file_id, rel_path, content, mtime, src))
+        for d in {os.path.dirname(manifest.abs_path(job[1])) for job in pending}:
+            os.makedirs(d, exist_ok=True)
+        written = failed = 0
+        for file_id, rel_path, content, mtime, src in pending:
+            dst = manifest.abs_path(rel_path)
+            if src is None:
+                with open(dst, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            else:
+                try:
+                    _place_companion(src, dst, companion_mode)
+                except OSError as e:
+                    logger.warning(f"伴随文件处理失败 ({src}): {e}")
+                    manifest.keep(file_id)
+                    failed += 1
+                    continue
+            manifest.record(file_id, rel_path, content, mtime)
+            written += 1
+        return written, failed
+
     async def generate_115_strm(self):
         """115 网盘：使用 fs_walk (目录树生成模式)"""
         if not self.config.get("enabled"): return
         cid = self.config.get("sourceCid115", "0")
-        out_dir = self.config.get("outputDir", "/data/strm")
         prefix = self.config.get("urlPrefix115", "")
         if not drive_115.client: 
             logger.warning("115 Client not initialized. Skipping.")
@@ -33,27 +241,17 @@ class StrmGenerator:
 
         try:
             logger.info(f"Starting 115 directory walk for CID: {cid}")
-            loop = asyncio.get_event_loop()
             file_walker = partial(drive_115.client.fs_walk, cid=cid)
-            
-            for item in await loop.run_in_executor(None, file_walker):
-                if "fid" not in item or item.get("path") is None: continue
-                
-                file_id = item["fid"]
-                rel_path = item["path"]
-                
-                download_url = await loop.run_in_executor(
-                    None, drive_115.client.get_download_url, file_id
-                )
-                
-                content = f"{prefix}{download_url}" 
-                save_path = os.path.join(out_dir, "115", f"{rel_path.lstrip('/')}.strm")
-                
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                async with aiofiles.open(save_path, 'w', encoding='utf-8') as f: 
-                    await f.write(content)
-
+            # 配置了 redirectBase 时 STRM 指向 /strm/115/{pickcode}，播放时才解析直链，生成阶段不调用下载接口；
+            # 没有 pickcode 的条目仍解析直链，与其他 115 调用共用同一个自适应限流器
+            redirect_base = self.config.get("redirectBase")
+            stats = await self._run_pipeline(
+                "115", file_walker, drive_115.client.get_download_url, prefix, limiter=get_115_limiter(),
+                link=lambda item: redirect_url(redirect_base, item.get("pickcode") or item.get("pc")),
+                settings={"redirectBase": redirect_base or ""},
+            )
             logger.info("115 STRM generation complete.")
+            return stats
         except Exception as e: 
             logger.error(f"115 STRM Error: {e}", exc_info=True)
 
@@ -61,7 +259,6 @@ class StrmGenerator:
         """123 云盘：使用 fs_walk (目录树生成模式)"""
         if not self.config.get("enabled"): return
         cid = self.config.get("sourceCid123", "0") # <--- 假设配置键是 sourceCid123
-        out_dir = self.config.get("outputDir", "/data/strm")
         prefix = self.config.get("urlPrefix123", "") # <--- 假设配置键是 urlPrefix123
         if not drive_123.client: 
             logger.warning("123 Client not initialized. Skipping.")
@@ -69,32 +266,13 @@ class StrmGenerator:
 
         try:
             logger.info(f"Starting 123 directory walk for CID: {cid}")
-            loop = asyncio.get_event_loop()
             file_walker = partial(drive_123.client.fs_walk, cid=cid)
-            
-            # 同样使用线程池包装阻塞的目录遍历
-            for item in await loop.run_in_executor(None, file_walker):
-                if "fid" not in item or item.get("path") is None: continue
-                
-                file_id = item["fid"]
-                rel_path = item["path"]
-                
-                download_url = await loop.run_in_executor(
-                    None, drive_123.client.get_download_url, file_id
-                )
-                
-                content = f"{prefix}{download_url}" 
-                save_path = os.path.join(out_dir, "123", f"{rel_path.lstrip('/')}.strm")
-                
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                async with aiofiles.open(save_path, 'w', encoding='utf-8') as f: 
-                    await f.write(content)
-
+            stats = await self._run_pipeline("123", file_walker, drive_123.client.get_download_url, prefix)
             logger.info("123 STRM generation complete.")
+            return stats
         except Exception as e: 
             logger.error(f"123 STRM Error: {e}", exc_info=True)
 
-
     async def generate_openlist_strm(self):
         """Openlist：使用异步递归遍历 (历遍目录模式)"""
         if not self.config.get("enabled"): return
@@ -102,23 +280,37 @@ class StrmGenerator:
         out_dir = self.config.get("outputDir", "/data/strm")
         prefix = self.config.get("urlPrefixOpenList", "")
 
+        manifest = StrmManifest(out_dir, "OpenList")
+        strm_filter = StrmFilter(self.config)
+        complete = False
         try:
             async def traverse(curr):
                 files = await drive_openlist.get_file_list(curr)
                 for f in files:
                     if f.get('children'): 
                         await traverse(f['id'])
-                    else:
-                        rel_path = f['id'] 
-                        content = f"{prefix}{rel_path}"
-                        save_path = os.path.join(out_dir, "OpenList", rel_path.lstrip('/')) + ".strm"
-                        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                        async with aiofiles.open(save_path, 'w', encoding='utf-8') as f2: 
-                            await f2.write(content)
+                        continue
+                    kind, _ = strm_filter.check(f['id'], item_size(f))
+                    if kind == SKIP: continue
+                    rel_path = os.path.join("OpenList", f['id'].lstrip('/'))
+                    if kind == COMPANION:
+                        await asyncio.to_thread(
+                            self._write_batch, manifest,
+                            [(f['id'], rel_path, None, self._item_mtime(f), strm_filter.companion_source(f['id']))],
+                            strm_filter.companion_mode,
+                        )
+                        continue
+                    # OpenList 的 STRM 内容只由路径决定，内容相同即跳过写盘
+                    await self._write_strm(manifest, f['id'], rel_path + ".strm", f"{prefix}{f['id']}", self._item_mtime(f))
 
             await traverse(src)
+            complete = True
             logger.info("OpenList STRM generation complete.")
         except Exception as e:
             logger.error(f"OpenList STRM Error: {e}", exc_info=True)
+        finally:
+            stats = {**manifest.finish(complete), "skipped": dict(strm_filter.skipped)}
+            logger.info(f"OpenList STRM manifest: {stats}")
+        return stats
 
 strm_gen = StrmGenerator()
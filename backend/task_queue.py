@@ -3,15 +3,39 @@ import threading
 import uuid
 import json
 import time
+from collections import deque
 from pathlib import Path
-from typing import Callable, Any
+from typing import Callable, Any, Optional, List, Dict
+
+from core.db import open_store, get_config
+from core.logger import push_log
+from core import event_bus
 
 BASE = Path(__file__).resolve().parent
+# 旧版本每个任务一个 json 文件，仅用于兼容读取历史任务
 TASK_DIR = BASE / "tasks"
-TASK_DIR.mkdir(exist_ok=True)
+TASK_DB = BASE / "tasks.db"
 
-_tasks = {}
-_lock = threading.Lock()
+# 任务元数据 + 追加式日志表；按状态 / 创建时间建索引
+TASK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+  id TEXT PRIMARY KEY,
+  status TEXT NOT NULL,
+  progress INTEGER NOT NULL DEFAULT 0,
+  result TEXT,
+  created_at REAL NOT NULL,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created_at);
+CREATE TABLE IF NOT EXISTS task_logs (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  task_id TEXT NOT NULL,
+  ts REAL NOT NULL,
+  msg TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_logs_task ON task_logs(task_id, seq);
+"""
 
 class TaskStatus:
     PENDING = "PENDING"
@@ -19,54 +43,217 @@ class TaskStatus:
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"
 
-def _save_task(task_id, meta):
-    p = TASK_DIR / f"{task_id}.json"
-    with open(p, "w", encoding="utf8") as f:
-        json.dump(meta, f, indent=2, ensure_ascii=False)
+class TaskPriority:
+    INTERACTIVE = "interactive"  # bot / API 触发的交互任务，优先调度
+    BULK = "bulk"                # STRM / 整理等批量任务
+
+# 调度顺序：越靠前优先级越高
+_PRIORITY_ORDER = (TaskPriority.INTERACTIVE, TaskPriority.BULK)
+
+def _int_config(key: str, default: int) -> int:
+    try:
+        return max(1, int(get_config(key, default)))
+    except Exception:
+        return default
+
+class _WorkerPool:
+    """
+    有界优先级线程池：固定数量的 worker 线程，按优先级取任务，
+    每个优先级另有并发上限（避免批量任务占满全部 worker）。
+    """
+    def __init__(self, workers: int, caps: Dict[str, int]):
+        self.workers = workers
+        self.caps = caps
+        self._cond = threading.Condition()
+        self._queues = {p: deque() for p in _PRIORITY_ORDER}
+        self._running = {p: 0 for p in _PRIORITY_ORDER}
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, priority: str, runner: Callable[[], None]):
+        with self._cond:
+            self._queues[priority].append(runner)
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker, name=f"task-worker-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+
+    def _take(self):
+        for p in _PRIORITY_ORDER:
+            if self._queues[p] and self._running[p] < self.caps[p]:
+                self._running[p] += 1
+                return p, self._queues[p].popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                item = self._take()
+                while item is None:
+                    self._cond.wait()
+                    item = self._take()
+            priority, runner = item
+            try:
+                runner()
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    # 释放了某个优先级的名额，唤醒所有 worker 重新挑选
+                    self._cond.notify_all()
 
-def _load_task(task_id):
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "started_workers": len(self._threads),
+                "queued": {p: len(q) for p, q in self._queues.items()},
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "running": dict(self._running),
+                "caps": dict(self.caps),
+            }
+
+_pool: Optional[_WorkerPool] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> _WorkerPool:
+    """首次提交任务时按配置创建线程池（task.workers / task.maxInteractive / task.maxBulk）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = _int_config("task.workers", 4)
+                caps = {
+                    TaskPriority.INTERACTIVE: min(workers, _int_config("task.maxInteractive", workers)),
+                    TaskPriority.BULK: min(workers, _int_config("task.maxBulk", 2)),
+                }
+                _pool = _WorkerPool(workers, caps)
+                push_log("INFO", f"任务线程池已启动：{workers} 个 worker，并发上限 {caps}")
+    return _pool
+
+def _conn():
+    return open_store(TASK_DB, TASK_SCHEMA)
+
+def _insert_task(task_id, created_at):
+    conn = _conn()
+    conn.execute(
+        "INSERT INTO tasks(id,status,progress,result,created_at,updated_at) VALUES(?,?,0,NULL,?,?)",
+        (task_id, TaskStatus.PENDING, created_at, created_at),
+    )
+    conn.commit()
+    event_bus.publish("task", {"task_id": task_id, "status": TaskStatus.PENDING, "progress": 0})
+
+def _set_status(task_id, status, progress=None, result=None, message=None):
+    now = time.time()
+    conn = _conn()
+    with conn:
+        if progress is None:
+            conn.execute("UPDATE tasks SET status=?, updated_at=? WHERE id=?", (status, now, task_id))
+        else:
+            conn.execute(
+                "UPDATE tasks SET status=?, progress=?, result=?, updated_at=? WHERE id=?",
+                (status, progress, result, now, task_id),
+            )
+        if message:
+            conn.execute("INSERT INTO task_logs(task_id,ts,msg) VALUES(?,?,?)", (task_id, now, message))
+    event = {"task_id": task_id, "status": status}
+    if progress is not None:
+        event["progress"] = progress
+    if message:
+        event["msg"] = message
+    event_bus.publish("task", event)
+
+def _append_progress(task_id, percent, message=None):
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE tasks SET progress=?, updated_at=? WHERE id=?", (percent, now, task_id))
+        if message:
+            conn.execute("INSERT INTO task_logs(task_id,ts,msg) VALUES(?,?,?)", (task_id, now, message))
+    event = {"task_id": task_id, "progress": percent}
+    if message:
+        event["msg"] = message
+    event_bus.publish("progress", event)
+
+def _row_to_meta(row):
+    task_id, status, progress, result, created_at, updated_at = row
+    return {
+        "id": task_id,
+        "status": status,
+        "progress": progress,
+        "result": json.loads(result) if result else None,
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
+
+def _load_legacy_task(task_id):
     p = TASK_DIR / f"{task_id}.json"
     if not p.exists():
         return None
     with open(p, "r", encoding="utf8") as f:
         return json.load(f)
 
-def submit_task(func: Callable[..., Any], *args, **kwargs) -> str:
+def submit_task(func: Callable[..., Any], *args, priority: str = TaskPriority.INTERACTIVE, **kwargs) -> str:
     """
     提交任务，返回 task_id
     func: 可调用，接受 (update_progress) 回调用于写日志
+    priority: TaskPriority.INTERACTIVE（默认）或 TaskPriority.BULK
     """
+    if priority not in _PRIORITY_ORDER:
+        raise ValueError(f"未知的任务优先级: {priority}")
     task_id = str(uuid.uuid4())
-    meta = {"id": task_id, "status": TaskStatus.PENDING, "progress": 0, "log": [], "result": None, "created_at": time.time()}
-    _save_task(task_id, meta)
+    _insert_task(task_id, time.time())
 
     def runner():
         try:
-            meta = _load_task(task_id)
-            meta["status"] = TaskStatus.RUNNING
-            _save_task(task_id, meta)
+            _set_status(task_id, TaskStatus.RUNNING)
 
             def update_progress(percent:int, message:str=None):
-                m = _load_task(task_id)
-                m["progress"] = percent
-                if message:
-                    m.setdefault("log", []).append({"ts": time.time(), "msg": message})
-                _save_task(task_id, m)
+                _append_progress(task_id, percent, message)
 
             res = func(update_progress, *args, **kwargs)
-            m = _load_task(task_id)
-            m["status"] = TaskStatus.SUCCESS
-            m["result"] = res
-            m["progress"] = 100
-            _save_task(task_id, m)
+            _set_status(task_id, TaskStatus.SUCCESS, progress=100,
+                        result=json.dumps(res, ensure_ascii=False, default=str))
         except Exception as e:
-            m = _load_task(task_id) or meta
-            m["status"] = TaskStatus.FAILED
-            m.setdefault("log", []).append({"ts": time.time(), "msg": f"Exception: {str(e)}"})
-            _save_task(task_id, m)
-    t = threading.Thread(target=runner, daemon=True)
-    t.start()
+            _set_status(task_id, TaskStatus.FAILED, message=f"Exception: {str(e)}")
+    _get_pool().submit(priority, runner)
     return task_id
 
-def get_task(task_id):
-    return _load_task(task_id)
+def get_queue_stats() -> Dict[str, Any]:
+    """线程池队列深度、各优先级运行数与并发上限"""
+    return _get_pool().stats()
+
+def get_task(task_id, log_limit: Optional[int] = None):
+    """返回任务元数据及日志（log_limit 指定时只返回最近 N 条日志）"""
+    conn = _conn()
+    row = conn.execute(
+        "SELECT id,status,progress,result,created_at,updated_at FROM tasks WHERE id=?", (task_id,)
+    ).fetchone()
+    if not row:
+        return _load_legacy_task(task_id)
+    meta = _row_to_meta(row)
+    if log_limit:
+        logs = conn.execute(
+            "SELECT ts,msg FROM (SELECT seq,ts,msg FROM task_logs WHERE task_id=? ORDER BY seq DESC LIMIT ?) ORDER BY seq",
+            (task_id, log_limit),
+        ).fetchall()
+    else:
+        logs = conn.execute("SELECT ts,msg FROM task_logs WHERE task_id=? ORDER BY seq", (task_id,)).fetchall()
+    meta["log"] = [{"ts": ts, "msg": msg} for ts, msg in logs]
+    return meta
+
+def list_tasks(status: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    """按创建时间倒序列出任务（不含日志），可按状态过滤"""
+    conn = _conn()
+    if status:
+        rows = conn.execute(
+            "SELECT id,status,progress,result,created_at,updated_at FROM tasks WHERE status=? "
+            "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (status, limit, offset),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT id,status,progress,result,created_at,updated_at FROM tasks "
+            "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        ).fetchall()
+    return [_row_to_meta(r) for r in rows]
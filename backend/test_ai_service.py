@@ -0,0 +1,87 @@
+# backend/test_ai_service.py
+"""AI 文件名解析：批量请求、缓存键与缓存有效期（OpenAI 接口由本地桩服务器模拟）"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services import service_ai
+from services.service_ai import AIService, release_pattern
+
+_LINE_RE = re.compile(r"^\s*(\d+)\. (.+)$", re.M)
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """按请求中的文件名列表返回解析结果：title 为文件名第一段"""
+    calls = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        names = {int(i): name for i, name in _LINE_RE.findall(body["messages"][0]["content"])}
+        self.calls.append(list(names.values()))
+        items = [{"index": i, "title": name.split(".")[0], "year": None, "season": None, "episode": None}
+                 for i, name in names.items()]
+        payload = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(items)}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    _StubHandler.calls = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+
+@pytest.fixture
+def ai(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(service_ai, "AI_CACHE_DB", tmp_path / "ai_cache.db")
+    svc = AIService()
+    svc.init_config({"organize": {"ai": {"enabled": True, "apiKey": "test", "baseUrl": stub_server, "batchSize": 2}}})
+    return svc
+
+def test_release_pattern_keeps_hyphenated_titles():
+    assert release_pattern("X-Men.2000.mkv") != release_pattern("X-Files.2000.mkv")
+    assert release_pattern("Spider-Man.mkv") == "spider-man"
+    assert (release_pattern("Movie.2020.1080p.BluRay.x264-SPARKS.mkv")
+            == release_pattern("Movie.2020.1080p.BluRay.x264-GECKOS.mkv"))
+
+def test_batches_and_cache(ai):
+    names = ["X-Men.2000.mkv", "X-Files.1998.mkv", "Spider-Man.2002.mkv"]
+    results = asyncio.run(ai.parse_filenames(names))
+    assert [results[n]["title"] for n in names] == ["X-Men", "X-Files", "Spider-Man"]
+    assert len(_StubHandler.calls) == 2  # batchSize=2
+
+    again = asyncio.run(ai.parse_filenames(names))
+    assert again == results
+    assert len(_StubHandler.calls) == 2
+    assert ai.stats["cache_hits"] == 3
+
+def test_pattern_hit_for_other_release_group(ai):
+    asyncio.run(ai.parse_filenames(["Movie.2020.1080p.BluRay.x264-SPARKS.mkv"]))
+    result = asyncio.run(ai.parse_filename("Movie.2020.1080p.BluRay.x264-GECKOS.mkv"))
+    assert result["title"] == "Movie"
+    assert len(_StubHandler.calls) == 1
+    assert ai.stats["pattern_hits"] == 1
+
+def test_expired_entries_are_not_used(ai):
+    asyncio.run(ai.parse_filename("X-Men.2000.mkv"))
+    time.sleep(0.01)
+    ai.cache_ttl = 0.005
+    asyncio.run(ai.parse_filename("X-Men.2000.mkv"))
+    assert len(_StubHandler.calls) == 2
@@ -20,7 +20,8 @@ def notify_emby_refresh():
     try:
         qps = int(get_config("emby_qps", 1))
         limiter = get_limiter("emby", qps)
-        if not limiter.consume():
+        # 后台流程可以多等一会，按配置速率排队执行
+        if not limiter.acquire(timeout=30):
             push_log("WARN", "Emby 请求受限（QPS）")
             return False
         url = f"{host.rstrip('/')}/Library/Refresh?api_key={api_key}"
@@ -0,0 +1,34 @@
+# backend/utils/pipeline.py
+"""
+新文件的后续处理流程：智能重命名/移动 → 生成 STRM → 通知 Emby 刷新 → TG 通知
+115 事件回调和目录变更监视器共用这一流程。
+"""
+
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from core.logger import push_log
+from core.zid_loader import load_zid
+from utils.rename import smart_rename_and_move
+from utils.strm import generate_strm_for_files
+from utils.events import notify_emby_refresh, notify_telegram
+
+def run_media_pipeline(files: Iterable[str], base_dir: str, settle_delay: float = 3,
+                       update_progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    # 1) 智能重命名与移动
+    moved = smart_rename_and_move(files, base_dir, zid_map=load_zid())
+    push_log("INFO", f"处理完成，移动 {len(moved)} 个文件")
+    if update_progress:
+        update_progress(50, f"重命名/移动完成: {len(moved)} 个文件")
+    # 2) 生成 STRM（延迟 settle_delay 秒再生成）
+    if settle_delay:
+        time.sleep(settle_delay)
+    strms = generate_strm_for_files(moved, target_dir=None, template="{filepath}")
+    push_log("INFO", f"生成 {len(strms)} 个 STRM 文件")
+    if update_progress:
+        update_progress(80, f"STRM 生成完成: {len(strms)} 个")
+    # 3) 通知 Emby 刷新（延迟 4 秒）
+    notify_emby_refresh()
+    # 4) 发送 TG 通知
+    notify_telegram(f"已整理并生成 STRM：{len(moved)} 个文件")
+    return {"moved": moved, "strms": strms}
@@ -1,15 +1,15 @@
 # backend/utils/rename.py
 """
 智能重命名与移动（适用于网盘路径）
-- 输入: files (list of path strings), base_dir (网盘路径)
+- 输入: files (路径字符串的可迭代对象，可以是分页遍历的生成器), base_dir (网盘路径)
 - 根据简单正则识别 movie / tv，并使用 zid 字典做二级分类
 - 返回: list of new paths (strings)
 """
 
 import re
-from typing import List, Dict
+from typing import Dict, Iterable, List
 from pathlib import Path
-from core.zid_loader import ZID_CACHE
+from core.zid_loader import load_zid
 from core.logger import push_log
 
 MOVIE_RE = re.compile(r"(?P<title>.+?)[\.\s_\-]\(?((?P<year>\d{4}))\)?", re.I)
@@ -18,20 +18,18 @@ TV_RE = re.compile(r"(?P<show>.+?)[\.\s_\-][Ss](?P<season>\d{1,2})[Ee](?P<episod
 def _normalize_name(s: str) -> str:
     return s.replace(".", " ").replace("_", " ").strip()
 
-def smart_rename_and_move(files: List[str], base_dir: str, zid_map: Dict = None) -> List[str]:
+def smart_rename_and_move(files: Iterable[str], base_dir: str, zid_map: Dict = None) -> List[str]:
     """
     对文件路径进行重命名与移动（调用 p115 move/rename 接口需要在外部处理）
     这里只生成目标路径并尝试调用 p115 move（若可用）。
     返回实际移动后的路径列表（如果调用失败则返回原路径）
     """
     results = []
-    zid_map = zid_map or ZID_CACHE or {}
+    zid_map = zid_map or load_zid() or {}
     # 尝试导入 p115 客户端以进行实际移动
     try:
-        from core.db import get_secret
-        from core.p115_client import P115Wrapper
-        cookie = get_secret("115_cookie")
-        p115 = P115Wrapper(cookie)
+        from core.p115_pool import p115_pool
+        p115 = p115_pool.get()
     except Exception:
         p115 = None
 
@@ -61,9 +59,9 @@ def smart_rename_and_move(files: List[str], base_dir: str, zid_map: Dict = None)
             dst = f"{base_dir.rstrip('/')}/{new_rel}"
             # 如果可以调用 p115 move，就尝试移动
             moved = None
-            if p115 and hasattr(p115.client, "move"):
+            if p115 and p115.supports("move"):
                 try:
-                    moved = p115.client.move(fp, dst)
+                    moved = p115.move(fp, dst)
                     push_log("INFO", f"移动文件 {fn} 到 {dst}")
                     results.append(dst if isinstance(moved, str) else dst)
                 except Exception:
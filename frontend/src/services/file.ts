@@ -7,6 +7,13 @@ export interface FileItem {
   date?: string;
 }
 
+export interface FilePage {
+  items: FileItem[];
+  /** 下一页游标，null 表示已取完 */
+  nextCursor: string | null;
+  total: number | null;
+}
+
 export const fileService = {
   /**
    * 列出文件
@@ -31,6 +38,38 @@ export const fileService = {
     return data.data as FileItem[];
   },
 
+  /**
+   * 分页列出文件（大目录懒加载）
+   * @param path 文件路径或 CID
+   * @param cursor 上一页返回的 nextCursor，首页不传
+   * @param limit 每页数量
+   */
+  async listFilesPage(path: string = '0', cursor?: string | null, limit: number = 200): Promise<FilePage> {
+    const params = new URLSearchParams({ path, limit: String(limit) });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const response = await fetch(`/api/file/list?${params.toString()}`);
+
+    if (!response.ok) {
+      if (response.status === 401) {
+        throw new Error('115 Cookie 未设置，请先登录');
+      }
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    if (data.code !== 0) {
+      throw new Error(data.msg || data.detail || '获取文件列表失败');
+    }
+
+    return {
+      items: data.data as FileItem[],
+      nextCursor: data.next_cursor ?? null,
+      total: data.total ?? null,
+    };
+  },
+
   /**
    * 移动文件
    * @param src 源路径
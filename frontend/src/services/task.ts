@@ -18,4 +18,31 @@ export const startOrganizeTask = async (): Promise<{ status: string; job_id?: st
         console.error("Failed to start organize task:", error);
         throw new Error(`无法连接后端或启动任务: ${error.message}`);
     }
-};
\ No newline at end of file
+};
+
+export interface TaskEvent {
+    task_id?: string;
+    status?: string;
+    progress?: number;
+    msg?: string;
+    level?: string;
+    ts: number;
+}
+
+/**
+ * 订阅任务事件流（SSE），替代轮询 /api/offline/status
+ * @param taskId 只接收该任务的事件；不传则接收全部
+ * @param onEvent 回调：type 为 task / progress / log
+ * @returns 关闭订阅的函数
+ */
+export const subscribeTaskEvents = (
+    taskId: string | undefined,
+    onEvent: (type: string, event: TaskEvent) => void
+): (() => void) => {
+    const query = taskId ? `?task_id=${encodeURIComponent(taskId)}` : '';
+    const source = new EventSource(`/api/task/events${query}`);
+    for (const type of ['task', 'progress', 'log']) {
+        source.addEventListener(type, (e) => onEvent(type, JSON.parse((e as MessageEvent).data)));
+    }
+    return () => source.close();
+};